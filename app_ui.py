@@ -8,8 +8,13 @@ import subprocess
 import hashlib
 import html
 import re
+import bisect
+import functools
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Dict
 
 from PySide6 import QtWidgets, QtGui, QtCore
 from PySide6.QtMultimedia import QMediaPlayer, QAudioOutput
@@ -66,24 +71,91 @@ def ms_to_timestr(ms: int) -> str:
     h, m = divmod(m, 60)
     return f"{h:02d}:{m:02d}:{s:02d}.{ms:03d}"
 
-_sudachi = dictionary.Dictionary().create()
+_sudachi_lock = threading.Lock()  # Sudachi 的 Tokenizer 不能被多个线程同时使用
+
+@functools.lru_cache(maxsize=1)
+def _get_sudachi():
+    # 词典首次用到时才加载，全进程共用一个实例；需在 _sudachi_lock 内调用
+    return dictionary.Dictionary().create()
+
+def warm_sudachi():
+    with _sudachi_lock:
+        _get_sudachi()
 _mode = sudachi_tokenizer.Tokenizer.SplitMode.C
 
+@functools.lru_cache(maxsize=4096)
+def _tokenize_cached(text: str) -> tuple:
+    # 同一字符串只过一次 Sudachi：(surface, reading, begin, end)
+    with _sudachi_lock:
+        ms = _get_sudachi().tokenize(text, _mode)
+    return tuple(
+        (m.surface() or "", m.reading_form() or m.surface() or "", m.begin(), m.end())
+        for m in ms
+    )
+
+# 行间分隔符用 \x1e（记录分隔符）：Sudachi 总把它切成单独的补助记号，不与相邻字符合并；
+# 换行/空格属于空白类，会和行首行尾的空白（\t、全角空格等）并成一个词，从而吃掉相邻行的字符
+_BATCH_SEP = "\x1e"
+_BATCH_MAX_CHARS = 4000  # 控制单次输入长度，避免超出 Sudachi 的输入上限
+
+def tokenize_batch(texts: List[str]) -> List[tuple]:
+    """多行文本用分隔符拼成一段送入 Sudachi，再按字符偏移拆回各行（偏移相对各行）。
+    万一有词跨越了行边界，涉及的行改为单独分词，而不是丢掉那个词"""
+    result: List[tuple] = []
+    sep_len = len(_BATCH_SEP)
+    i = 0
+    while i < len(texts):
+        j, size = i, 0
+        while j < len(texts) and (j == i or size + len(texts[j]) + sep_len <= _BATCH_MAX_CHARS):
+            size += len(texts[j]) + sep_len
+            j += 1
+        bases, pos = [], 0
+        for t in texts[i:j]:
+            bases.append(pos)
+            pos += len(t) + sep_len
+        per_row: List[list] = [[] for _ in range(j - i)]
+        redo = set()
+        with _sudachi_lock:
+            ms = _get_sudachi().tokenize(_BATCH_SEP.join(texts[i:j]), _mode)
+        for m in ms:
+            begin, end = m.begin(), m.end()
+            k = bisect.bisect_right(bases, begin) - 1
+            base = bases[k]
+            row_end = base + len(texts[i + k])
+            if end > row_end:
+                if begin == row_end and end == row_end + sep_len:
+                    continue  # 分隔符本身
+                # 跨行的切分：起止两端所在的行都重新单独分词
+                redo.add(k)
+                redo.add(bisect.bisect_right(bases, end - 1) - 1)
+                continue
+            surf = m.surface() or ""
+            per_row[k].append((surf, m.reading_form() or surf, begin - base, end - base))
+        result.extend(_tokenize_cached(texts[i + k]) if k in redo else tuple(r)
+                      for k, r in enumerate(per_row))
+        i = j
+    return result
+
 def tokenize_surface(q: str):
-    for m in _sudachi.tokenize(q, _mode):
-        w = m.surface().strip()
+    for surf, _, _, _ in _tokenize_cached(q):
+        w = surf.strip()
         if w:
             yield w
 
-def tokenize_reading(q: str):
-    for m in _sudachi.tokenize(q, _mode):
-        r = (m.reading_form() or m.surface()).strip()
-        if r:
-            yield r
+def is_fts_term(surface: str) -> bool:
+    # 表层形不含任何字母数字的词（标点、〜、♪ 等）在索引里不存在，AND 上它只会让查询落空
+    return any(ch.isalnum() for ch in surface)
 
-def build_match_query(query: str):
-    s_tokens = [t.replace('"', '').replace("'", "") for t in tokenize_surface(query)]
-    r_tokens = [t.replace('"', '').replace("'", "") for t in tokenize_reading(query)]
+def fts_terms(tokens) -> List[str]:
+    # FTS5 字面量 "..."（内部引号加倍）：无需删引号，也不会被解析成运算符
+    return ['"' + t.replace('"', '""') + '"' for t in tokens]
+
+def build_match_query(query: str, phrases: Optional[List[str]] = None):
+    # 是否跳过一个词只看它的表层形，并同时作用于表层与读音两组（否则 〜 的读音“キゴウ”会留在读音组里）
+    pairs = [(surf.strip(), read.strip()) for surf, read, _, _ in _tokenize_cached(query)]
+    pairs = [(s, r) for s, r in pairs if is_fts_term(s)]
+    s_tokens = fts_terms(s for s, _ in pairs)
+    r_tokens = fts_terms(r for _, r in pairs if r)
     parts = []
     if s_tokens:
         parts.append(" AND ".join(f'text_tok:{t}' for t in s_tokens))
@@ -91,7 +163,17 @@ def build_match_query(query: str):
         parts.append(" AND ".join(f'reading_tok:{t}' for t in r_tokens))
     if not parts:
         return None
-    return " OR ".join(f'({p})' for p in parts if p)
+    expr = " OR ".join(f'({p})' for p in parts if p)
+    # 短语用 FTS5 短语语法下推到 SQLite：要求分词后的原文中连续出现这些词；
+    # 纯符号的词同样不在索引里，须剔除，整句都是符号（如「〜」）时只靠 query_hits 的子串复核
+    phrase_parts = []
+    for ph in phrases or []:
+        toks = [t.replace('"', '""') for t in tokenize_surface(ph) if is_fts_term(t)]
+        if toks:
+            phrase_parts.append('text_tok:"' + " ".join(toks) + '"')
+    if phrase_parts:
+        expr = f"({expr}) AND " + " AND ".join(phrase_parts)
+    return expr
 
 QUOTE_RE = re.compile(r'"([^"]+)"|“([^”]+)”|『([^』]+)』|「([^」]+)」')
 
@@ -103,16 +185,48 @@ def parse_query(query: str) -> Tuple[str, List[str], set, set]:
                 phrases.append(g.strip())
                 break
     surf_set, read_set = set(), set()
-    for m in _sudachi.tokenize(query, _mode):
-        s = (m.surface() or "").strip()
-        r = (m.reading_form() or m.surface() or "").strip()
+    for surf, read, _, _ in _tokenize_cached(query):
+        s = surf.strip()
+        r = read.strip()
         if s:
             surf_set.add(s)
         if r:
             read_set.add(r)
     return query, phrases, surf_set, read_set
 
+_SQL_BM25 = """
+SELECT e.title, e.media_type, e.start_ms, e.end_ms, e.text, e.source_path
+FROM fts
+JOIN entries e ON e.rowid = fts.rowid
+WHERE fts MATCH ?
+ORDER BY bm25(fts)
+LIMIT ?
+"""
+_SQL_PLAIN = """
+SELECT e.title, e.media_type, e.start_ms, e.end_ms, e.text, e.source_path
+FROM fts
+JOIN entries e ON e.rowid = fts.rowid
+WHERE fts MATCH ?
+LIMIT ?
+"""
+_HAS_BM25 = True  # 连接建立时探测一次，之后每次查询直接选用对应 SQL
+
+def detect_bm25(conn: sqlite3.Connection):
+    global _HAS_BM25
+    try:
+        conn.execute("SELECT bm25(fts) FROM fts LIMIT 0").fetchall()
+        _HAS_BM25 = True
+    except sqlite3.OperationalError as e:
+        # 还没有 fts 表时保持默认，等建好索引后查询时再判断
+        if "no such function: bm25" in str(e).lower():
+            _HAS_BM25 = False
+
+_schema_ready = False  # DDL 每个进程只需执行一次
+
 def ensure_schema(conn: sqlite3.Connection):
+    global _schema_ready
+    if _schema_ready:
+        return
     cur = conn.cursor()
     cur.executescript("""
     CREATE TABLE IF NOT EXISTS media_links(
@@ -121,84 +235,86 @@ def ensure_schema(conn: sqlite3.Connection):
     );
     """)
     conn.commit()
+    _schema_ready = True
 
 def get_db_conn() -> sqlite3.Connection:
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(str(DB_PATH))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA cache_size=-65536")
     ensure_schema(conn)
+    detect_bm25(conn)
     return conn
 
+PHRASE_OVERFETCH = 2  # 有短语时多取的倍数，留给子串复核筛掉的行
+
 def query_hits(conn: sqlite3.Connection, query: str, phrases: List[str], topn: int = 50):
-    match_expr = build_match_query(query)
+    global _HAS_BM25
+    match_expr = build_match_query(query, phrases)
     if not match_expr:
         return []
-    cur = conn.cursor()
-    sql = """
-    SELECT e.title, e.media_type, e.start_ms, e.end_ms, e.text, e.source_path
-    FROM fts
-    JOIN entries e ON e.rowid = fts.rowid
-    WHERE fts MATCH ?
-    ORDER BY bm25(fts)
-    LIMIT ?
-    """
-    params = [match_expr, topn * 5]
+    params = (match_expr, topn * PHRASE_OVERFETCH if phrases else topn)
     try:
-        rows = cur.execute(sql, params).fetchall()
+        rows = conn.execute(_SQL_BM25 if _HAS_BM25 else _SQL_PLAIN, params).fetchall()
     except sqlite3.OperationalError as e:
         msg = str(e).lower()
         # 若用户尚未建立索引（没有 fts 表），返回空并在状态栏提示
         if "no such table: fts" in msg:
             return []
         if "no such function: bm25" in msg:
-            sql = """
-            SELECT e.title, e.media_type, e.start_ms, e.end_ms, e.text, e.source_path
-            FROM fts
-            JOIN entries e ON e.rowid = fts.rowid
-            WHERE fts MATCH ?
-            LIMIT ?
-            """
-            rows = cur.execute(sql, params).fetchall()
+            _HAS_BM25 = False
+            rows = conn.execute(_SQL_PLAIN, params).fetchall()
         else:
             raise
-
     if phrases:
-        def has_all(txt: str) -> bool:
-            t = txt or ""
-            return all(p in t for p in phrases)
-        rows = [r for r in rows if has_all(r[4])]
-        rows = rows[:topn]
-    else:
-        rows = rows[:topn]
+        # FTS 只保证词序相邻（标点不入索引，「の名」也能命中“君の、名は”），再按原文子串复核
+        rows = [r for r in rows if all(ph in r[4] for ph in phrases)][:topn]
     return rows
 
-def find_media_candidates(source_path: Optional[Path], media_root: Optional[Path]) -> List[Path]:
+MEDIA_EXT_ORDER = (".mkv", ".mp4", ".ts", ".m4v", ".avi", ".mov", ".mp3", ".flac", ".m4a", ".aac", ".wav", ".ogg")
+MEDIA_EXTS = frozenset(MEDIA_EXT_ORDER)
+
+def build_media_index(media_root: Path) -> Dict[str, List[Path]]:
+    """一次遍历媒体根目录，按小写 stem 建立索引，避免每个扩展名各 rglob 一遍"""
+    index: Dict[str, List[Path]] = {}
+    for p in media_root.rglob("*"):
+        if p.suffix.lower() in MEDIA_EXTS and p.is_file():
+            index.setdefault(p.stem.lower(), []).append(p)
+    return index
+
+def find_media_candidates(source_path: Optional[Path], media_root: Optional[Path],
+                          media_index: Optional[Dict[str, List[Path]]] = None) -> List[Path]:
     candidates: List[Path] = []
     stem: Optional[str] = None
     if source_path:
         stem = source_path.stem
         folder = source_path.parent
-        for ext in [".mkv", ".mp4", ".ts", ".m4v", ".avi", ".mov", ".mp3", ".flac", ".m4a", ".aac", ".wav", ".ogg"]:
-            p = folder / f"{stem}{ext}"
-            if p.exists():
-                candidates.append(p)
-        if not candidates:
-            for p in folder.iterdir():
-                if p.is_file() and p.suffix.lower() in {".mkv",".mp4",".ts",".m4v",".avi",".mov",".mp3",".flac",".m4a",".aac",".wav",".ogg"}:
-                    candidates.append(p)
+        # 只读一次目录：同 stem 的优先，否则退回同目录全部媒体
+        media: List[Path] = []
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if os.path.splitext(entry.name)[1].lower() in MEDIA_EXTS and entry.is_file():
+                        media.append(Path(entry.path))
+        except OSError:
+            pass
+        # 两侧都转小写，兼容大小写不敏感的文件系统
+        same = [p for p in media if p.stem.lower() == stem.lower()]
+        same.sort(key=lambda p: MEDIA_EXT_ORDER.index(p.suffix.lower()))
+        candidates.extend(same or media)
     if media_root:
         if stem:
-            for ext in [".mkv", ".mp4", ".ts", ".m4v", ".avi", ".mov", ".mp3", ".flac", ".m4a", ".aac", ".wav", ".ogg"]:
-                for p in media_root.rglob(f"{stem}{ext}"):
-                    candidates.append(p)
+            if media_index is None:
+                media_index = build_media_index(media_root)
+            candidates.extend(media_index.get(stem.lower(), ()))
         elif not candidates:
             for p in media_root.glob("*"):
-                if p.is_file() and p.suffix.lower() in {".mkv",".mp4",".ts",".m4v",".avi",".mov",".mp3",".flac",".m4a",".aac",".wav",".ogg"}:
+                if p.is_file() and p.suffix.lower() in MEDIA_EXTS:
                     candidates.append(p)
-    uniq, seen = [], set()
-    for p in candidates:
-        if p not in seen:
-            uniq.append(p); seen.add(p)
-    return uniq
+    return list(dict.fromkeys(candidates))  # 去重，保持顺序
 
 def load_config():
     CONFIG_PATH.parent.mkdir(parents=True, exist_ok=True)
@@ -269,105 +385,198 @@ def resolve_ffmpeg(cfg: dict, parent: QtWidgets.QWidget) -> Optional[str]:
         return path
     return None
 
-def make_snippet(ffmpeg_exe: str, media: Path, start_ms: int, end_ms: int, pad_ms=400) -> Optional[Path]:
+SNIPPET_MEMO_SIZE = 256
+_SNIPPET_MEMO: "OrderedDict[Tuple[str, int, int, int], Path]" = OrderedDict()  # 本进程内已生成的片段（LRU）
+_SNIPPET_MEMO_GUARD = threading.Lock()
+_SNIPPET_LOCKS: Dict[Tuple[str, int, int, int], list] = {}  # 片段 -> [锁, 等待/持有者数]
+_SNIPPET_LOCKS_GUARD = threading.Lock()
+
+def _memo_get(memo_key: Tuple[str, int, int, int]) -> Optional[Path]:
+    # 缓存目录可能被清理，命中时确认文件仍在，不在则作废该项
+    with _SNIPPET_MEMO_GUARD:
+        out = _SNIPPET_MEMO.get(memo_key)
+        if out is None:
+            return None
+        if not out.exists():
+            del _SNIPPET_MEMO[memo_key]
+            return None
+        _SNIPPET_MEMO.move_to_end(memo_key)
+        return out
+
+def _memo_put(memo_key: Tuple[str, int, int, int], out: Path):
+    with _SNIPPET_MEMO_GUARD:
+        _SNIPPET_MEMO[memo_key] = out
+        _SNIPPET_MEMO.move_to_end(memo_key)
+        while len(_SNIPPET_MEMO) > SNIPPET_MEMO_SIZE:
+            _SNIPPET_MEMO.popitem(last=False)
+
+@contextmanager
+def _snippet_lock(memo_key: Tuple[str, int, int, int]):
+    # 后台预生成与点击播放可能同时处理同一片段，按片段加锁，避免两个 ffmpeg 写同一文件；
+    # 最后一个使用者退出时删掉该锁，锁表不随处理过的片段数增长
+    with _SNIPPET_LOCKS_GUARD:
+        entry = _SNIPPET_LOCKS.setdefault(memo_key, [threading.Lock(), 0])
+        entry[1] += 1
     try:
-        CACHE_DIR.mkdir(parents=True, exist_ok=True)
-        key = f"{media}|{start_ms}|{end_ms}|{pad_ms}"
-        h = hashlib.md5(key.encode("utf-8")).hexdigest()  # nosec
-        out = CACHE_DIR / f"{h}.mp3"
-        if out.exists() and out.stat().st_size > 1024:
+        with entry[0]:
+            yield
+    finally:
+        with _SNIPPET_LOCKS_GUARD:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _SNIPPET_LOCKS[memo_key]
+
+def ms_to_ffsec(ms: int) -> str:
+    # 毫秒 -> ffmpeg 的秒数参数（如 12.345），纯整数运算，不经过浮点格式化
+    ms = int(ms)
+    return f"{ms // 1000}.{ms % 1000:03d}"
+
+def make_snippet(ffmpeg_exe: str, media: Path, start_ms: int, end_ms: int, pad_ms=400) -> Optional[Path]:
+    memo_key = (str(media), start_ms, end_ms, pad_ms)
+    out = _memo_get(memo_key)
+    if out is not None:
+        return out
+    with _snippet_lock(memo_key):
+        out = _memo_get(memo_key)
+        if out is not None:
             return out
-        ss = max(0, start_ms - pad_ms)
-        dur = max(1, (end_ms - start_ms) + 2 * pad_ms)
-        args = [
-            ffmpeg_exe, "-ss", f"{ss/1000:.3f}", "-i", str(media),
-            "-t", f"{dur/1000:.3f}", "-vn", "-ac", "2", "-ar", "48000",
-            "-b:a", "160k", "-y", str(out),
-        ]
-        subprocess.run(args, check=True, creationflags=subprocess.CREATE_NO_WINDOW)
-        return out if out.exists() else None
-    except Exception:
-        return None
+        try:
+            key = f"{media}|{start_ms}|{end_ms}|{pad_ms}"
+            h = hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+            out = CACHE_DIR / f"{h}.mp3"
+            if out.exists() and out.stat().st_size > 1024:
+                _memo_put(memo_key, out)
+                return out
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            ss = max(0, start_ms - pad_ms)
+            dur = max(1, (end_ms - start_ms) + 2 * pad_ms)
+            args = [
+                ffmpeg_exe, "-ss", ms_to_ffsec(ss), "-i", str(media),
+                "-t", ms_to_ffsec(dur), "-vn", "-ac", "2", "-ar", "48000",
+                "-b:a", "160k", "-y", str(out),
+            ]
+            subprocess.run(args, check=True, creationflags=subprocess.CREATE_NO_WINDOW)
+            if not out.exists():
+                return None
+            _memo_put(memo_key, out)
+            return out
+        except Exception:
+            return None
 
 # ----------------- 高亮构建（可调样式） -----------------
 HIGHLIGHT_TOKEN_STYLE  = "background-color:#FFE69A; color:#202020; border-radius:4px; padding:0 3px;"
 HIGHLIGHT_PHRASE_STYLE = "background-color:#BAF7C7; color:#103E1E; border-radius:4px; padding:0 3px;"
+HTML_SPECIAL_RE = re.compile(r"[&<>\"']")
+_PHRASE_OPEN = f'<span style="{HIGHLIGHT_PHRASE_STYLE}">'
+_TOKEN_OPEN = f'<span style="{HIGHLIGHT_TOKEN_STYLE}">'
+_CLOSE = "</span>"
 
 def subtract_intervals(a: Tuple[int, int], bs: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    # bs 须已排序且互不重叠（即 find_phrase_ranges 的输出），可二分跳到首个相交区间后单趟扫描
     s, e = a
-    segments = [(s, e)]
-    for bs_s, bs_e in bs:
-        new_segments = []
-        for x, y in segments:
-            if bs_e <= x or bs_s >= y:
-                new_segments.append((x, y))
-            else:
-                if x < bs_s:
-                    new_segments.append((x, bs_s))
-                if bs_e < y:
-                    new_segments.append((bs_e, y))
-        segments = new_segments
-        if not segments:
+    segments: List[Tuple[int, int]] = []
+    cur = s
+    for bs_s, bs_e in bs[bisect.bisect_right(bs, s, key=lambda b: b[1]):]:
+        if bs_s >= e:
             break
-    return [(x, y) for x, y in segments if y > x]
-
-def find_phrase_ranges(text: str, phrases: List[str]) -> List[Tuple[int, int]]:
-    ranges: List[Tuple[int, int]] = []
-    for p in phrases:
-        if not p:
-            continue
-        start = 0
-        while True:
-            i = text.find(p, start)
-            if i == -1:
-                break
-            ranges.append((i, i + len(p)))
-            start = i + len(p)
-    ranges.sort()
+        if cur < bs_s:
+            segments.append((cur, bs_s))
+        cur = max(cur, bs_e)
+    if cur < e:
+        segments.append((cur, e))
+    return segments
+
+def compile_phrases(phrases: List[str]) -> Optional[re.Pattern]:
+    # 所有短语编译成一个交替正则，包在零宽前瞻里：每个位置都尝试一次（长短语优先），
+    # 这样相互重叠的短语（如 AB 与 BC 之于 ABC）也都能找到，而不是只取不重叠的匹配
+    ps = sorted({p for p in phrases if p}, key=len, reverse=True)
+    if not ps:
+        return None
+    return re.compile("(?=(" + "|".join(re.escape(p) for p in ps) + "))")
+
+def find_phrase_ranges(text: str, phrase_re: Optional[re.Pattern]) -> List[Tuple[int, int]]:
+    if phrase_re is None:
+        return []
+    # finditer 的结果已按起点有序，线性合并相邻/重叠区间即可（匹配本身是零宽的，区间取第 1 组）
     merged: List[Tuple[int, int]] = []
-    for s, e in ranges:
+    for m in phrase_re.finditer(text):
+        s, e = m.span(1)
         if not merged or s > merged[-1][1]:
             merged.append((s, e))
         else:
             merged[-1] = (merged[-1][0], max(merged[-1][1], e))
     return merged
 
-def build_highlight_html(text: str, phrases: List[str], surf_qset: set, read_qset: set) -> str:
-    if not text:
-        return ""
-    phrase_ranges = find_phrase_ranges(text, phrases)
+# 纯假名/标点文本中，读音命中必然以字面形式出现，可以先用正则廉价筛一遍
+KANA_ONLY_RE = re.compile(r"[\u3040-\u30ff\u3000-\u303f\uff01-\uff0f\uff1a-\uff20\s!-/:-@\[-`{-~…‥]*")
+_KATA2HIRA = str.maketrans({chr(c): chr(c - 0x60) for c in range(0x30A1, 0x30F7)})
 
-    token_ranges: List[Tuple[int, int]] = []
-    for m in _sudachi.tokenize(text, _mode):
-        surf = m.surface() or ""
-        read = m.reading_form() or surf
-        if (surf in surf_qset) or (read in read_qset):
-            pieces = subtract_intervals((m.begin(), m.end()), phrase_ranges)
-            token_ranges.extend(pieces)
+def compile_token_screen(surf_qset: set, read_qset: set) -> Optional[re.Pattern]:
+    toks = set(surf_qset) | set(read_qset) | {r.translate(_KATA2HIRA) for r in read_qset}
+    toks.discard("")
+    if not toks:
+        return None
+    return re.compile("|".join(re.escape(t) for t in sorted(toks, key=len, reverse=True)))
 
+def merge_labeled(phrase_ranges: List[Tuple[int, int]], token_ranges: List[Tuple[int, int]]) -> List[Tuple[int, int, str]]:
+    # token 区间已扣除短语部分，不会与短语重叠：排序后单趟合并同类相邻区间即可
     labeled = [(s, e, "phrase") for s, e in phrase_ranges] + [(s, e, "token") for s, e in token_ranges]
     labeled.sort(key=lambda x: (x[0], x[2] != "phrase"))
-
     out: List[Tuple[int, int, str]] = []
     for s, e, t in labeled:
-        if t == "token" and any(not (e <= ps or s >= pe) for ps, pe, pt in out if pt == "phrase"):
-            continue
         if out and out[-1][2] == t and s <= out[-1][1]:
             out[-1] = (out[-1][0], max(out[-1][1], e), t)
         else:
             out.append((s, e, t))
+    return out
+
+def screened_out(text: str, phrase_re: Optional[re.Pattern], screen_re: Optional[re.Pattern]) -> bool:
+    # 先筛后验：纯假名行里找不到任何查询词/短语时，无需 Sudachi
+    return bool(screen_re is not None and KANA_ONLY_RE.fullmatch(text)
+                and not screen_re.search(text)
+                and (phrase_re is None or not phrase_re.search(text)))
+
+def tokenize_rows_for_highlight(rows, phrase_re: Optional[re.Pattern],
+                                screen_re: Optional[re.Pattern]) -> List[Optional[tuple]]:
+    # 需要高亮的行一次性批量分词，代替逐行调用 Sudachi；被筛掉的行为 None
+    texts = [str(r[4]) for r in rows]
+    need = [i for i, t in enumerate(texts) if t and not screened_out(t, phrase_re, screen_re)]
+    row_tokens: List[Optional[tuple]] = [None] * len(rows)
+    for i, toks in zip(need, tokenize_batch([texts[i] for i in need])):
+        row_tokens[i] = toks
+    return row_tokens
+
+def build_highlight_html(text: str, phrase_re: Optional[re.Pattern], surf_qset: set, read_qset: set,
+                         screen_re: Optional[re.Pattern] = None, tokens: Optional[tuple] = None) -> str:
+    if not text:
+        return ""
+    if screened_out(text, phrase_re, screen_re):
+        return html.escape(text)
+    phrase_ranges = find_phrase_ranges(text, phrase_re)
+    if tokens is None:
+        tokens = _tokenize_cached(text)
+
+    token_ranges: List[Tuple[int, int]] = []
+    for surf, read, begin, end in tokens:
+        if (surf in surf_qset) or (read in read_qset):
+            pieces = subtract_intervals((begin, end), phrase_ranges)
+            token_ranges.extend(pieces)
+
+    out = merge_labeled(phrase_ranges, token_ranges)
 
+    # 绝大多数字幕行不含 HTML 特殊字符，此时直接切片，不再逐段调用 html.escape
+    escape = html.escape if HTML_SPECIAL_RE.search(text) else str
     cur = 0
     parts: List[str] = []
     for s, e, t in out:
         if cur < s:
-            parts.append(html.escape(text[cur:s]))
-        seg = html.escape(text[s:e])
-        style = HIGHLIGHT_PHRASE_STYLE if t == "phrase" else HIGHLIGHT_TOKEN_STYLE
-        parts.append(f'<span style="{style}">{seg}</span>')
+            parts.append(escape(text[cur:s]))
+        parts.append(_PHRASE_OPEN if t == "phrase" else _TOKEN_OPEN)
+        parts.append(escape(text[s:e]))
+        parts.append(_CLOSE)
         cur = e
     if cur < len(text):
-        parts.append(html.escape(text[cur:]))
+        parts.append(escape(text[cur:]))
     return "".join(parts)
 
 # ----------------- 扁平风样式（收敛 hover 误触） -----------------
@@ -477,7 +686,7 @@ def apply_flat_style(app: QtWidgets.QApplication, window: QtWidgets.QMainWindow
         border: none;
         border-bottom: 1px solid {palette['border']};
     }}
-    QTableWidget {{
+    QTableView {{
         background: {palette['card']};
         border: 1px solid {palette['border']};
         border-radius: 10px;
@@ -486,15 +695,15 @@ def apply_flat_style(app: QtWidgets.QApplication, window: QtWidgets.QMainWindow
         selection-color: {palette['sel_fg']};
         outline: none;
     }}
-    QTableWidget::item:hover {{
+    QTableView::item:hover {{
         background: transparent;
         color: {palette['text']};
     }}
-    QTableWidget::item:selected {{
+    QTableView::item:selected {{
         background: {palette['sel_bg']};
         color: {palette['sel_fg']};
     }}
-    QTableWidget::item:selected:hover {{
+    QTableView::item:selected:hover {{
         background: {palette['sel_bg']};
         color: {palette['sel_fg']};
     }}
@@ -535,6 +744,55 @@ def apply_flat_style(app: QtWidgets.QApplication, window: QtWidgets.QMainWindow
     """
     app.setStyleSheet(qss)
 
+# ----------------- 后台搜索 -----------------
+class SearchSignals(QtCore.QObject):
+    done = QtCore.Signal(int, object, object)   # generation, rows, row_tokens
+    failed = QtCore.Signal(int, str)            # generation, message
+
+# 搜索线程的连接按线程 id 保存：QThreadPool 的线程每次执行任务后 Python 线程状态会被销毁，
+# threading.local 存不住；PRAGMA、建表检查与 bm25 探测只在该线程首次搜索时执行一次
+_THREAD_CONNS: Dict[int, sqlite3.Connection] = {}
+_THREAD_CONNS_GUARD = threading.Lock()
+
+def _thread_conn() -> sqlite3.Connection:
+    tid = threading.get_ident()
+    with _THREAD_CONNS_GUARD:
+        conn = _THREAD_CONNS.get(tid)
+    if conn is None:
+        conn = get_db_conn()
+        with _THREAD_CONNS_GUARD:
+            _THREAD_CONNS[tid] = conn
+    return conn
+
+def _close_thread_conn():
+    # sqlite3 连接只能在创建它的线程里关闭，须作为任务投递到该线程执行
+    with _THREAD_CONNS_GUARD:
+        conn = _THREAD_CONNS.pop(threading.get_ident(), None)
+    if conn is not None:
+        conn.close()
+
+class SearchJob(QtCore.QRunnable):
+    """在线程池中完成 FTS 查询与结果分词，GUI 线程只负责填表"""
+    def __init__(self, gen: int, query: str, phrases: List[str],
+                 phrase_re: Optional[re.Pattern], screen_re: Optional[re.Pattern], topn: int = 200):
+        super().__init__()
+        self.gen = gen
+        self.query = query
+        self.phrases = phrases
+        self.phrase_re = phrase_re
+        self.screen_re = screen_re
+        self.topn = topn
+        self.signals = SearchSignals()
+
+    def run(self):
+        try:
+            rows = query_hits(_thread_conn(), self.query, self.phrases, topn=self.topn)
+            row_tokens = tokenize_rows_for_highlight(rows, self.phrase_re, self.screen_re)
+        except Exception as ex:
+            self.signals.failed.emit(self.gen, str(ex))
+            return
+        self.signals.done.emit(self.gen, rows, row_tokens)
+
 # ----------------- 简易音频播放器 -----------------
 class AudioPlayer(QtWidgets.QWidget):
     def __init__(self, parent=None):
@@ -607,18 +865,66 @@ class AudioPlayer(QtWidgets.QWidget):
         self.lbl_time.setText(f"{cur} / {dur}")
 
 # ----------------- 原文列 HTML 渲染委托 -----------------
+ROW_ROLE = QtCore.Qt.ItemDataRole.UserRole + 1  # 第 0 列存放原始结果行
+
 class RichTextDelegate(QtWidgets.QStyledItemDelegate):
+    """原文列在绘制时才生成高亮 HTML，只为真正可见的行付出分词成本。"""
+    DOC_CACHE_SIZE = 512
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._version = 0
+        self._phrase_re: Optional[re.Pattern] = None
+        self._screen_re: Optional[re.Pattern] = None
+        self._surf_qset: set = set()
+        self._read_qset: set = set()
+        # (查询版本, 行号) -> 已排版的 QTextDocument；滚动/选中重绘时直接复用
+        self._doc_cache: "OrderedDict[tuple, QtGui.QTextDocument]" = OrderedDict()
+        self._row_tokens: List[Optional[tuple]] = []
+
+    def set_query(self, version: int, phrase_re: Optional[re.Pattern], surf_qset: set, read_qset: set,
+                  screen_re: Optional[re.Pattern] = None):
+        self._version = version
+        self._phrase_re, self._surf_qset, self._read_qset = phrase_re, surf_qset, read_qset
+        self._screen_re = screen_re
+        self._doc_cache.clear()
+        self._row_tokens = []
+
+    def set_row_tokens(self, row_tokens: List[Optional[tuple]]):
+        # 由 tokenize_batch 预先批量得到的各行分词结果
+        self._row_tokens = row_tokens
+
+    def _html_for(self, index) -> str:
+        text = index.data(QtCore.Qt.ItemDataRole.DisplayRole) or ""
+        row = index.row()
+        tokens = self._row_tokens[row] if row < len(self._row_tokens) else None
+        return build_highlight_html(str(text), self._phrase_re, self._surf_qset, self._read_qset,
+                                    self._screen_re, tokens)
+
+    def _doc_for(self, option, index) -> QtGui.QTextDocument:
+        key = (self._version, index.row())
+        doc = self._doc_cache.get(key)
+        if doc is None:
+            doc = QtGui.QTextDocument()
+            doc.setDefaultFont(option.font)
+            doc.setHtml(self._html_for(index))
+            self._doc_cache[key] = doc
+            if len(self._doc_cache) > self.DOC_CACHE_SIZE:
+                self._doc_cache.popitem(last=False)
+        else:
+            self._doc_cache.move_to_end(key)
+        width = option.rect.width()
+        if doc.textWidth() != width:
+            doc.setTextWidth(width)
+        return doc
+
     def paint(self, painter, option, index):
         if index.column() != 3:
             return super().paint(painter, option, index)
         painter.save()
         if option.state & QtWidgets.QStyle.StateFlag.State_Selected:
             painter.fillRect(option.rect, option.palette.highlight())
-        doc = QtGui.QTextDocument()
-        doc.setDefaultFont(option.font)
-        html_text = index.data(QtCore.Qt.ItemDataRole.UserRole) or index.data(QtCore.Qt.ItemDataRole.DisplayRole) or ""
-        doc.setHtml(html_text)
-        doc.setTextWidth(option.rect.width())
+        doc = self._doc_for(option, index)
         painter.translate(option.rect.topLeft())
         ctx = QtGui.QAbstractTextDocumentLayout.PaintContext()
         doc.documentLayout().draw(painter, ctx)
@@ -627,27 +933,53 @@ class RichTextDelegate(QtWidgets.QStyledItemDelegate):
     def sizeHint(self, option, index):
         if index.column() != 3:
             return super().sizeHint(option, index)
-        doc = QtGui.QTextDocument()
-        doc.setDefaultFont(option.font)
-        html_text = index.data(QtCore.Qt.ItemDataRole.UserRole) or index.data(QtCore.Qt.ItemDataRole.DisplayRole) or ""
-        doc.setHtml(html_text)
-        doc.setTextWidth(option.rect.width())
+        doc = self._doc_for(option, index)
         h = doc.size().height()
         return QtCore.QSize(int(doc.idealWidth()), int(h))
 
 # ----------------- 主窗口 -----------------
 class MainWindow(QtWidgets.QMainWindow):
+    PREFETCH_ROWS = 8  # 搜索后预生成音频片段的行数
+    MEDIA_CACHE_SIZE = 256  # 字幕 -> 绑定媒体 的缓存条数
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("JP Finder - 扁平风")
         self.resize(1180, 760)
 
         self.cfg = load_config()
-        self.conn = get_db_conn()
+        # 后台预热 Sudachi 词典，首次搜索不必等待加载
+        QtCore.QThreadPool.globalInstance().start(QtCore.QRunnable.create(warm_sudachi))
+        try:
+            self.conn = get_db_conn()
+        except sqlite3.OperationalError as ex:
+            # 索引构建器运行期间独占数据库（locking_mode=EXCLUSIVE），此时无法打开
+            QtWidgets.QMessageBox.critical(
+                self, "无法打开数据库",
+                f"{DB_PATH}\n{ex}\n\n若索引构建器正在运行，请等待构建完成后再启动。"
+            )
+            raise SystemExit(1)
         self.last_rows: list = []
         self.q_surf_set: set = set()
         self.q_read_set: set = set()
         self.q_phrases: List[str] = []
+        self._query_version = 0
+        self._search_gen = 0
+        self._snippet_gen = 0
+        # 搜索固定在一个常驻线程里执行，整个会话只用一个搜索连接；旧搜索的结果按 gen 丢弃，串行即可
+        self._search_pool = QtCore.QThreadPool(self)
+        self._search_pool.setMaxThreadCount(1)
+        self._search_pool.setExpiryTimeout(-1)
+        self._snippet_pool = QtCore.QThreadPool(self)
+        self._snippet_pool.setMaxThreadCount(max(1, min(4, QtCore.QThread.idealThreadCount() // 2)))
+        self._phrase_re: Optional[re.Pattern] = None
+        self._token_screen_re: Optional[re.Pattern] = None
+        self._mediaroot_index: Optional[Tuple[Path, Dict[str, List[Path]]]] = None
+        self._media_misses: set = set()  # 当前索引里确认没有媒体的 stem（小写）
+        # 播放路径上的缓存：已解析的 ffmpeg/ffplay 路径，以及 字幕路径 -> 已绑定媒体
+        self._ffmpeg: Optional[str] = None
+        self._ffplay: Optional[str] = None
+        self._media_cache: "OrderedDict[str, Path]" = OrderedDict()
 
         # 顶部 AppBar
         self.appbar = QtWidgets.QFrame()
@@ -688,9 +1020,10 @@ class MainWindow(QtWidgets.QMainWindow):
         res_layout.setContentsMargins(12, 12, 12, 12)
         res_layout.setSpacing(8)
 
-        self.table = QtWidgets.QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(["作品", "类型", "时间", "原文（命中高亮）", "源字幕路径"])
+        self.table = QtWidgets.QTableView()
+        self.model = QtGui.QStandardItemModel(0, 5, self.table)
+        self.model.setHorizontalHeaderLabels(["作品", "类型", "时间", "原文（命中高亮）", "源字幕路径"])
+        self.table.setModel(self.model)
         header = self.table.horizontalHeader()
         header.setSectionResizeMode(0, QtWidgets.QHeaderView.ResizeMode.ResizeToContents)
         header.setSectionResizeMode(1, QtWidgets.QHeaderView.ResizeMode.ResizeToContents)
@@ -703,7 +1036,8 @@ class MainWindow(QtWidgets.QMainWindow):
         self.table.setShowGrid(False)
         self.table.verticalHeader().setVisible(False)
         self.table.verticalHeader().setDefaultSectionSize(36)
-        self.table.setItemDelegateForColumn(3, RichTextDelegate(self.table))
+        self.rich_delegate = RichTextDelegate(self.table)
+        self.table.setItemDelegateForColumn(3, self.rich_delegate)
 
         res_layout.addWidget(self.table)
 
@@ -768,11 +1102,54 @@ class MainWindow(QtWidgets.QMainWindow):
                 f"未检测到索引数据库的 FTS 表。\n请先运行 build_index.py，将 --db 指向：\n{DB_PATH}"
             )
 
+    def _get_media_index(self, media_root: Optional[Path], stem: Optional[str] = None) -> Optional[Dict[str, List[Path]]]:
+        # 媒体根目录的 stem 索引首次使用时建立，之后各行复用；
+        # 给出 stem 时若索引里没有它或记录的文件已不存在（目录有增删），就重建一次。
+        # 重建后仍找不到的 stem 记入 _media_misses，下次不再为它遍历整个目录树（直到下一次重建）
+        if media_root is None:
+            return None
+        key = stem.lower() if stem else None
+        if self._mediaroot_index is None or self._mediaroot_index[0] != media_root:
+            self._rebuild_media_index(media_root)
+        elif key and key not in self._media_misses:
+            hits = self._mediaroot_index[1].get(key)
+            if not hits or not all(p.exists() for p in hits):
+                self._rebuild_media_index(media_root)
+        index = self._mediaroot_index[1]
+        if key and key not in index:
+            self._media_misses.add(key)
+        return index
+
+    def _rebuild_media_index(self, media_root: Path):
+        self._mediaroot_index = (media_root, build_media_index(media_root))
+        self._media_misses.clear()
+
+    def _bound_media(self, source_path: Optional[Path]) -> Optional[Path]:
+        # 同一字幕重复播放时跳过 media_links 查询（只缓存命中结果）
+        if not source_path:
+            return None
+        key = str(source_path)
+        media = self._media_cache.get(key)
+        if media is not None:
+            self._media_cache.move_to_end(key)
+            return media
+        media = get_bound_media(self.conn, source_path)
+        if media is not None:
+            self._remember_media(key, media)
+        return media
+
+    def _remember_media(self, key: str, media: Path):
+        self._media_cache[key] = media
+        self._media_cache.move_to_end(key)
+        while len(self._media_cache) > self.MEDIA_CACHE_SIZE:
+            self._media_cache.popitem(last=False)
+
     def pick_media_root(self):
         d = QtWidgets.QFileDialog.getExistingDirectory(self, "选择媒体根目录")
         if d:
             self.cfg["media_root"] = d
             save_config(self.cfg)
+            self._mediaroot_index = None
             self.status.showMessage(f"数据库: {DB_PATH} | 媒体目录: {self.cfg.get('media_root','')}")
 
     def do_search(self):
@@ -781,39 +1158,99 @@ class MainWindow(QtWidgets.QMainWindow):
             return
         _, phrases, surf_set, read_set = parse_query(q)
         self.q_phrases = phrases
+        self._phrase_re = compile_phrases(phrases)
+        self._token_screen_re = compile_token_screen(surf_set, read_set)
         self.q_surf_set, self.q_read_set = surf_set, read_set
 
-        rows = query_hits(self.conn, q, phrases, topn=200)
+        # 递增代号；旧查询的结果回来时直接丢弃
+        self._search_gen += 1
+        job = SearchJob(self._search_gen, q, phrases, self._phrase_re, self._token_screen_re, topn=200)
+        job.signals.done.connect(self._on_search_done)
+        job.signals.failed.connect(self._on_search_failed)
+        self._search_pool.start(job)
+        self.status.showMessage("搜索中…")
+
+    def _on_search_done(self, gen: int, rows, row_tokens):
+        if gen != self._search_gen:
+            return
+        self._query_version += 1
+        self.rich_delegate.set_query(self._query_version, self._phrase_re, self.q_surf_set, self.q_read_set,
+                                     self._token_screen_re)
+        self.rich_delegate.set_row_tokens(row_tokens)
         self.last_rows = rows
         self.fill_table(rows)
+        self._prefetch_snippets(rows)
         note = f"命中 {len(rows)} 条"
-        if phrases:
-            note += f"（短语：{'，'.join(phrases)}）"
+        if self.q_phrases:
+            note += f"（短语：{'，'.join(self.q_phrases)}）"
         self.status.showMessage(note)
 
+    def _prefetch_snippets(self, rows):
+        """趁用户浏览结果时，后台为前几行预先裁切音频片段"""
+        self._snippet_gen += 1
+        self._snippet_pool.clear()  # 丢弃上一次搜索尚未开始的任务
+        if not self.chk_internal.isChecked():
+            return
+        # 只用已配置的 ffmpeg，不在后台弹出选择对话框
+        ffmpeg_exe = self.cfg.get("ffmpeg_path")
+        if not ffmpeg_exe or not Path(ffmpeg_exe).exists():
+            return
+        # 媒体根目录的索引若尚未建立则只看字幕同目录，避免在 GUI 线程上遍历整个目录树
+        media_root, media_index = None, None
+        if self._mediaroot_index is not None and self.cfg.get("media_root"):
+            if self._mediaroot_index[0] == Path(self.cfg["media_root"]).resolve():
+                media_root, media_index = self._mediaroot_index
+        gen = self._snippet_gen
+        for title, mtype, start_ms, end_ms, text, src in rows[:self.PREFETCH_ROWS]:
+            source_path = Path(src) if src and str(src).strip() else None
+            media = self._bound_media(source_path)
+            if media is None:
+                cands = find_media_candidates(source_path, media_root, media_index)
+                if len(cands) != 1:
+                    continue  # 多个候选需要用户选择，播放时再处理
+                media = cands[0]
+            job = functools.partial(self._prefetch_one, gen, ffmpeg_exe, media, start_ms, end_ms)
+            self._snippet_pool.start(QtCore.QRunnable.create(job))
+
+    def _prefetch_one(self, gen: int, ffmpeg_exe: str, media: Path, start_ms: int, end_ms: int):
+        if gen != self._snippet_gen:
+            return  # 已有更新的搜索
+        make_snippet(ffmpeg_exe, media, start_ms, end_ms, pad_ms=400)
+
+    def _on_search_failed(self, gen: int, msg: str):
+        if gen != self._search_gen:
+            return
+        self.status.showMessage(f"搜索失败: {msg}")
+
     def fill_table(self, rows):
-        self.table.setRowCount(0)
-        self.table.setRowCount(len(rows))
-        for i, (title, mtype, s, e, text, src) in enumerate(rows):
-            time_str = f"{ms_to_timestr(s)} - {ms_to_timestr(e)}"
-            it0 = QtWidgets.QTableWidgetItem(str(title)); it0.setTextAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
-            it1 = QtWidgets.QTableWidgetItem(str(mtype)); it1.setTextAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
-            it2 = QtWidgets.QTableWidgetItem(time_str);  it2.setTextAlignment(QtCore.Qt.AlignmentFlag.AlignCenter)
-
-            it3 = QtWidgets.QTableWidgetItem(str(text))
-            html_text = build_highlight_html(str(text), self.q_phrases, self.q_surf_set, self.q_read_set)
-            it3.setData(QtCore.Qt.ItemDataRole.UserRole, html_text)
-
-            it4 = QtWidgets.QTableWidgetItem(str(src))
-
-            self.table.setItem(i, 0, it0)
-            self.table.setItem(i, 1, it1)
-            self.table.setItem(i, 2, it2)
-            self.table.setItem(i, 3, it3)
-            self.table.setItem(i, 4, it4)
+        # 批量填充期间关闭重绘与排序；行数一次设定（只发一次 rowsInserted、视图只重排一次），
+        # 再用 setItem 逐格填入，不用 appendRow 逐行插入
+        self.table.setUpdatesEnabled(False)
+        self.table.setSortingEnabled(False)
+        try:
+            self.model.setRowCount(0)
+            self.model.setRowCount(len(rows))
+            center = QtCore.Qt.AlignmentFlag.AlignCenter
+            set_item = self.model.setItem
+            for r, row in enumerate(rows):
+                title, mtype, s, e, text, src = row
+                # 同一作品的行共享标题/类型/路径字符串
+                title, mtype, src = sys.intern(str(title)), sys.intern(str(mtype)), sys.intern(str(src))
+                time_str = f"{ms_to_timestr(s)} - {ms_to_timestr(e)}"
+                it0 = QtGui.QStandardItem(title); it0.setTextAlignment(center)
+                it0.setData(tuple(row), ROW_ROLE)
+                it1 = QtGui.QStandardItem(mtype); it1.setTextAlignment(center)
+                it2 = QtGui.QStandardItem(time_str);  it2.setTextAlignment(center)
+                # 高亮 HTML 由 RichTextDelegate 在绘制时按需生成
+                it3 = QtGui.QStandardItem(str(text))
+                it4 = QtGui.QStandardItem(src)
+                for c, it in enumerate((it0, it1, it2, it3, it4)):
+                    set_item(r, c, it)
+        finally:
+            self.table.setUpdatesEnabled(True)
 
     def _item_text(self, row: int, col: int) -> Optional[str]:
-        it = self.table.item(row, col)
+        it = self.model.item(row, col)
         return it.text() if it is not None else None
 
     def get_selected_row(self):
@@ -823,6 +1260,9 @@ class MainWindow(QtWidgets.QMainWindow):
         idx = sel[0].row()
         if 0 <= idx < len(self.last_rows):
             return self.last_rows[idx]
+        it = self.model.item(idx, 0)
+        if it is not None and it.data(ROW_ROLE):
+            return it.data(ROW_ROLE)
         # 兜底
         title = self._item_text(idx, 0)
         text = self._item_text(idx, 3)
@@ -845,10 +1285,11 @@ class MainWindow(QtWidgets.QMainWindow):
         title, mtype, start_ms, end_ms, text, src = row
         source_path = Path(src) if src and str(src).strip() else None
 
-        media = get_bound_media(self.conn, source_path)
+        media = self._bound_media(source_path)
         if media is None:
             media_root = Path(self.cfg["media_root"]).resolve() if self.cfg.get("media_root") else None
-            cands = find_media_candidates(source_path, media_root)
+            media_index = self._get_media_index(media_root, source_path.stem if source_path else None)
+            cands = find_media_candidates(source_path, media_root, media_index)
             if not cands:
                 QtWidgets.QMessageBox.information(self, "提示", "未找到媒体文件。\n请在右上角设置媒体目录，或把视频与字幕放在同一文件夹。")
                 return
@@ -859,9 +1300,12 @@ class MainWindow(QtWidgets.QMainWindow):
             media = Path(item)
             if source_path:
                 bind_media(self.conn, source_path, media)
+                self._remember_media(str(source_path), media)
 
         if self.chk_internal.isChecked():
-            ffmpeg_exe = resolve_ffmpeg(self.cfg, self)
+            if self._ffmpeg is None:
+                self._ffmpeg = resolve_ffmpeg(self.cfg, self)
+            ffmpeg_exe = self._ffmpeg
             if not ffmpeg_exe:
                 QtWidgets.QMessageBox.information(self, "提示", "未设置 ffmpeg.exe，无法裁切片段。")
                 return
@@ -871,18 +1315,27 @@ class MainWindow(QtWidgets.QMainWindow):
                 return
             self.audio.play_file(out)
         else:
-            ffplay_exe = resolve_ffplay(self.cfg, self)
+            if self._ffplay is None:
+                self._ffplay = resolve_ffplay(self.cfg, self)
+            ffplay_exe = self._ffplay
             if not ffplay_exe:
                 QtWidgets.QMessageBox.information(self, "提示", "未设置 ffplay.exe，无法播放。")
                 return
             show_video = self.chk_show_video.isChecked()
             ss = max(0, start_ms - 400)
             dur = max(1, (end_ms - start_ms) + 800)
-            args = [ffplay_exe, "-ss", f"{ss/1000:.3f}", "-t", f"{dur/1000:.3f}", "-i", str(media), "-autoexit", "-loglevel", "error"]
+            args = [ffplay_exe, "-ss", ms_to_ffsec(ss), "-t", ms_to_ffsec(dur), "-i", str(media), "-autoexit", "-loglevel", "error"]
             if not show_video:
                 args += ["-vn", "-nodisp"]
             subprocess.Popen(args, creationflags=subprocess.CREATE_NO_WINDOW)
 
+    def closeEvent(self, event):
+        # 在搜索线程里关闭它的连接，再关闭界面线程的连接
+        self._search_pool.start(QtCore.QRunnable.create(_close_thread_conn))
+        self._search_pool.waitForDone()
+        self.conn.close()
+        super().closeEvent(event)
+
 def main():
     app = QtWidgets.QApplication(sys.argv)
     apply_flat_style(app, theme="light")  # "dark" / "light"
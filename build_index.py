@@ -1,53 +1,58 @@
 # build_index.py
 import argparse
+import functools
 import json
 import sqlite3
 import unicodedata
-import re
 from pathlib import Path
-from typing import Iterable, Tuple
+from typing import Tuple
 from tqdm import tqdm
 
 # Sudachi
 from sudachipy import dictionary, tokenizer as sudachi_tokenizer
 
-def nfkc(text: str) -> str:
-    return unicodedata.normalize("NFKC", text or "").strip()
-
-# 去掉双向控制等不可见控制字符（你的样例里“‪”就是这类字符）
-BIDI_CTRL_RE = re.compile(r"[\u200e\u200f\u202a-\u202e\u2066-\u2069]")
-def clean_controls(text: str) -> str:
-    return BIDI_CTRL_RE.sub("", text)
+# 去掉双向控制等不可见控制字符（你的样例里“‪”就是这类字符）；码位固定，用 translate 表一次删除
+BIDI_CTRL_TRANS = dict.fromkeys([0x200e, 0x200f, *range(0x202a, 0x202f), *range(0x2066, 0x206a)])
 
 def jp_clean(text: str) -> str:
-    return clean_controls(nfkc(text))
+    # NFKC + 去控制符 + strip，单次归一化
+    return unicodedata.normalize("NFKC", text).translate(BIDI_CTRL_TRANS).strip() if text else ""
 
-# Sudachi 初始化（C 模式倾向于短词，适合检索）
-_sudachi = dictionary.Dictionary().create()
+# Sudachi 初始化（C 模式倾向于短词，适合检索）；词典在首次分词时才加载
 _mode = sudachi_tokenizer.Tokenizer.SplitMode.C
 
-def tokenize_surface(text: str) -> Iterable[str]:
-    for m in _sudachi.tokenize(text, _mode):
-        surf = m.surface()
-        s = surf.strip()
-        if s:
-            yield s
+@functools.lru_cache(maxsize=1)
+def _get_sudachi():
+    return dictionary.Dictionary().create()
 
-def tokenize_reading_kana(text: str) -> Iterable[str]:
-    for m in _sudachi.tokenize(text, _mode):
+@functools.lru_cache(maxsize=131072)  # 重复台词（OP/ED、副歌）只分词一次
+def tokenize_both(text: str) -> Tuple[str, str]:
+    """一次 Sudachi 分析同时得到 (分词原文, 分词读音)，均为空格分隔"""
+    surfs, reads = [], []
+    for m in _get_sudachi().tokenize(text, _mode):
+        s = m.surface().strip()
+        if s:
+            surfs.append(s)
         r = m.reading_form()  # 通常是カタカナ
         if not r or r == "*":
             r = m.surface()
         r = r.strip()
         if r:
-            yield r
+            reads.append(r)
+    return " ".join(surfs), " ".join(reads)
 
 def ensure_schema(conn: sqlite3.Connection):
     cur = conn.cursor()
     # 主表存元数据与原文
+    # page_size 只对新库生效，且必须在建表（及切换 WAL）之前设置
+    if cur.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone() is None:
+        cur.execute("PRAGMA page_size=8192")
     cur.executescript("""
     PRAGMA journal_mode=WAL;
-    PRAGMA synchronous=OFF;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA cache_size=-262144;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA mmap_size=268435456;
 
     CREATE TABLE IF NOT EXISTS entries(
         id TEXT UNIQUE,
@@ -60,7 +65,9 @@ def ensure_schema(conn: sqlite3.Connection):
         end_ms INTEGER,
         text TEXT,
         context_prev TEXT,
-        context_next TEXT
+        context_next TEXT,
+        text_tok TEXT,      -- 分词结果也存进主表，FTS 可直接从这两列 rebuild，无需再跑 Sudachi
+        reading_tok TEXT
     );
 
     -- FTS5 外部内容表，仅索引分词后的两个字段
@@ -72,37 +79,49 @@ def ensure_schema(conn: sqlite3.Connection):
         content_rowid='rowid'
     );
     """)
+    # 旧库没有分词列时补上
+    cols = {r[1] for r in cur.execute("PRAGMA table_info(entries)")}
+    for col in ("text_tok", "reading_tok"):
+        if col not in cols:
+            cur.execute(f"ALTER TABLE entries ADD COLUMN {col} TEXT")
     conn.commit()
 
 def insert_entry(cur: sqlite3.Cursor, row: dict):
-    # 插入主表
+    # 计算分词（row 在 build 中已清洗）
+    text_tok, reading_tok = tokenize_both(row["text"])
+    # 插入主表（连同分词列）
     cur.execute("""
         INSERT OR IGNORE INTO entries
-        (id, media_type, title, episode_or_track, media_path, source_path, start_ms, end_ms, text, context_prev, context_next)
-        VALUES (?,?,?,?,?,?,?,?,?,?,?)
+        (id, media_type, title, episode_or_track, media_path, source_path, start_ms, end_ms, text, context_prev, context_next, text_tok, reading_tok)
+        VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)
     """, (
         row["id"], row["media_type"], row.get("title",""), row.get("episode_or_track",""),
         row.get("media_path",""), row.get("source_path",""),
         int(row["start_ms"]), int(row["end_ms"]),
-        row["text"], row.get("context_prev",""), row.get("context_next","")
+        row["text"], row.get("context_prev",""), row.get("context_next",""),
+        text_tok, reading_tok
     ))
+    # id 已存在时 INSERT 被忽略，其 FTS 行早已写入
+    if cur.rowcount == 0:
+        return
     # 取刚插入行的 rowid
-    cur.execute("SELECT rowid FROM entries WHERE id = ?", (row["id"],))
-    rid = cur.fetchone()[0]
-    # 计算分词
-    text = jp_clean(row["text"])
-    text_tok = " ".join(tokenize_surface(text))
-    reading_tok = " ".join(tokenize_reading_kana(text))
+    rid = cur.lastrowid
     # 插入 FTS
     cur.execute("INSERT INTO fts(rowid, text_tok, reading_tok) VALUES (?,?,?)",
                 (rid, text_tok, reading_tok))
 
+COMMIT_EVERY = 5000
+
 def build(db_path: Path, jsonl_path: Path):
-    conn = sqlite3.connect(str(db_path))
+    # isolation_level=None：模块不再隐式 BEGIN，事务完全由下面显式的 BEGIN/commit 控制；
+    # 热点 INSERT 的 SQL 文本保持不变，可命中语句缓存
+    conn = sqlite3.connect(str(db_path), isolation_level=None, cached_statements=256)
     ensure_schema(conn)
     cur = conn.cursor()
 
     total = 0
+    # 显式事务：每 COMMIT_EVERY 行提交一次，避免逐条语句的隐式事务开销
+    cur.execute("BEGIN")
     with jsonl_path.open("r", encoding="utf-8") as f:
         for line in tqdm(f, desc="Indexing"):
             line = line.strip()
@@ -117,8 +136,9 @@ def build(db_path: Path, jsonl_path: Path):
                 continue
             insert_entry(cur, obj)
             total += 1
-            if total % 1000 == 0:
+            if total % COMMIT_EVERY == 0:
                 conn.commit()
+                cur.execute("BEGIN")
     conn.commit()
     # 为常用过滤加索引（可选）
     cur.execute("CREATE INDEX IF NOT EXISTS idx_entries_title ON entries(title)")
@@ -127,15 +147,37 @@ def build(db_path: Path, jsonl_path: Path):
     conn.close()
     print(f"Indexed rows: {total}")
 
+def rebuild_fts(db_path: Path):
+    """用 entries 中已存的分词列整体重建 FTS，不重新解析 JSONL。
+    旧库中缺少分词列的行先补分词（仅这些行需要 Sudachi）。"""
+    conn = sqlite3.connect(str(db_path), isolation_level=None, cached_statements=256)
+    ensure_schema(conn)
+    cur = conn.cursor()
+    cur.execute("BEGIN")
+    missing = cur.execute("SELECT rowid, text FROM entries WHERE text_tok IS NULL").fetchall()
+    cur.executemany("UPDATE entries SET text_tok = ?, reading_tok = ? WHERE rowid = ?",
+                    ((*tokenize_both(text or ""), rid) for rid, text in tqdm(missing, desc="Tokenizing")))
+    cur.execute("INSERT INTO fts(fts) VALUES('rebuild')")
+    conn.commit()
+    conn.close()
+    print(f"Rebuilt FTS (re-tokenized {len(missing)} rows)")
+
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--jsonl", required=True, help="parse_media.py 生成的 JSONL 路径")
+    ap.add_argument("--jsonl", help="parse_media.py 生成的 JSONL 路径")
     ap.add_argument("--db", default="data/index.db", help="输出 SQLite 数据库文件")
+    ap.add_argument("--rebuild-fts", action="store_true", help="仅用库中已存的分词列重建全文索引")
     args = ap.parse_args()
 
     db_path = Path(args.db)
     db_path.parent.mkdir(parents=True, exist_ok=True)
 
+    if args.rebuild_fts:
+        rebuild_fts(db_path)
+        return
+    if not args.jsonl:
+        ap.error("--jsonl is required unless --rebuild-fts is given")
+
     jsonl_path = Path(args.jsonl)
     if not jsonl_path.exists():
         print(f"JSONL not found: {jsonl_path}")
@@ -5,9 +5,17 @@ import sys
 import json
 import re
 import sqlite3
+import multiprocessing
 import unicodedata
+import functools
+import operator
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 
 from PySide6 import QtWidgets, QtGui, QtCore
 import pysubs2
@@ -27,50 +35,133 @@ BASE = get_base_dir()
 DEFAULT_DB = BASE / "data" / "index.db"
 
 # ------------------ 文本与解析工具 ------------------
-_sudachi = dictionary.Dictionary().create()
 _mode = sudachi_tokenizer.Tokenizer.SplitMode.C
 
-BIDI_CTRL_RE = re.compile(r"[\u200e\u200f\u202a-\u202e\u2066-\u2069]")  # 清理不可见控制符
+# 分词后端：默认 sudachi；设置环境变量 JPFINDER_TOKENIZER=fugashi 可改用 MeCab(fugashi + UniDic)，速度快得多。
+# 注意：主程序查询仍用 Sudachi 分词，切分粒度不同可能导致部分查询命中变少，换后端后应整体重建索引并自行权衡。
+TOKENIZER_BACKEND = (os.getenv("JPFINDER_TOKENIZER") or "sudachi").strip().lower()
 
-def nfkc(x: str) -> str:
-    return unicodedata.normalize("NFKC", x or "").strip()
+@functools.lru_cache(maxsize=1)
+def _get_sudachi():
+    # 延迟加载：分词子进程各自在首次使用时加载一份词典
+    return dictionary.Dictionary().create()
 
-def clean_controls(x: str) -> str:
-    return BIDI_CTRL_RE.sub("", x or "")
+@functools.lru_cache(maxsize=1)
+def _get_fugashi():
+    import fugashi  # 可选依赖，仅在选择该后端时导入
+    return fugashi.Tagger()
 
-def jp_clean(x: str) -> str:
-    return clean_controls(nfkc(x))
+def _iter_sudachi(text: str):
+    for m in _get_sudachi().tokenize(text, _mode):
+        yield m.surface() or "", m.reading_form() or ""
 
-def tokenize_surface(text: str):
-    for m in _sudachi.tokenize(text, _mode):
-        s = (m.surface() or "").strip()
-        if s:
-            yield s
+def _iter_fugashi(text: str):
+    for w in _get_fugashi()(text):
+        f = w.feature
+        yield w.surface or "", getattr(f, "kana", None) or getattr(f, "pron", None) or ""
+
+_TOKEN_BACKENDS = {"sudachi": _iter_sudachi, "fugashi": _iter_fugashi}
 
-def tokenize_reading_kana(text: str):
-    for m in _sudachi.tokenize(text, _mode):
-        r = (m.reading_form() or m.surface() or "").strip()
+# 清理不可见控制符：码位固定，用 translate 表一次删除
+BIDI_CTRL_TRANS = dict.fromkeys([0x200e, 0x200f, *range(0x202a, 0x202f), *range(0x2066, 0x206a)])
+
+def jp_clean(x: str) -> str:
+    return unicodedata.normalize("NFKC", x).translate(BIDI_CTRL_TRANS).strip() if x else ""
+
+# 字幕/歌词里重复行很多（OP/ED、副歌），同一文本只分词一次。
+# 分词在进程池子进程里进行，缓存是每个子进程各一份，随构建结束、进程池关闭而释放
+TOKENIZE_CACHE_SIZE = 131072
+
+@functools.lru_cache(maxsize=TOKENIZE_CACHE_SIZE)
+def tokenize_both(text: str) -> Tuple[str, str]:
+    # 一次分析同时得到分词原文与读音（空格分隔）；无读音时回退到原文
+    surfs, reads = [], []
+    for surf, read in _TOKEN_BACKENDS.get(TOKENIZER_BACKEND, _iter_sudachi)(text):
+        s = surf.strip()
+        if s:
+            surfs.append(s)
+        r = (read or surf).strip()
         if r:
-            yield r
+            reads.append(r)
+    return " ".join(surfs), " ".join(reads)
+
+def tokenize_chunk(texts: List[str]) -> List[Tuple[str, str]]:
+    # 进程池任务：对一批文本分词，返回与输入一一对应的 (text_tok, reading_tok)；文本已在解析时清洗
+    return [tokenize_both(t) for t in texts]
+
+def iter_files(root: Path, exts: Tuple[str, ...]):
+    # os.scandir 递归：先按文件名后缀过滤，命中才 stat，避免对媒体等无关文件逐个 stat
+    stack = [str(root)]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for e in it:
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        stack.append(e.path)
+                    elif e.name.lower().endswith(exts) and e.is_file():
+                        yield Path(e.path)
+                except OSError:
+                    continue
 
 def read_text_guess(path: Path) -> str:
+    # 只读一次字节，再在内存里依次尝试解码
+    data = path.read_bytes()
+    if data[:3] == b"\xef\xbb\xbf":
+        # 带 BOM 也严格解码：有坏字节时不悄悄丢弃，去掉 BOM 后继续尝试其他编码
+        data = data[3:]
+        try:
+            return data.decode("utf-8")
+        except UnicodeDecodeError:
+            pass
     for enc in ("utf-8", "cp932", "cp936"):
         try:
-            return path.read_text(encoding=enc)
+            return data.decode(enc)
         except UnicodeDecodeError:
             continue
-    return path.read_text(encoding="utf-8", errors="ignore")
+    return data.decode("utf-8", errors="ignore")
+
+_LRC_TIME_RE = re.compile(r"\[(\d{1,2}):(\d{2})(?:[.:](\d{1,3}))?\]")
+_ASS_TAG_RE = re.compile(r"\{[^}]*\}")
+
+_BY_START = operator.itemgetter("start_ms")
+
+def link_context(entries: List[Dict]):
+    # 相邻行互为上下文：错位 zip，省去逐行下标与边界判断
+    texts = [e["text"] for e in entries]
+    for e, prev, nxt in zip(entries, [""] + texts[:-1], texts[1:] + [""]):
+        e["context_prev"] = prev
+        e["context_next"] = nxt
+
+def _tags_leading(tags) -> bool:
+    # 标签是否从行首开始且首尾相接，如 [00:01.00][00:30.00]歌词
+    pos = 0
+    for m in tags:
+        if m.start() != pos:
+            return False
+        pos = m.end()
+    return True
 
 def parse_lrc(path: Path) -> List[Dict]:
+    # 同一文件的所有条目共用，避免逐行重新解析路径
+    path_str = str(path); stem_str = path.stem
     txt = read_text_guess(path)
     lines = txt.splitlines()
     entries = []
-    time_tag = re.compile(r"\[(\d{1,2}):(\d{2})(?:[.:](\d{1,3}))?\]")
+    # LRC 基本按时间顺序书写：记录是否出现倒序，只有倒序时才排序
+    in_order, last_start = True, -1
     for line in lines:
-        tags = list(time_tag.finditer(line))
+        tags = list(_LRC_TIME_RE.finditer(line))
         if not tags:
             continue
-        text = time_tag.sub("", line).strip()
+        # 时间标签通常全部在行首：直接切掉最后一个标签之前的部分，省去 sub 的第二遍扫描
+        if _tags_leading(tags):
+            text = line[tags[-1].end():].strip()
+        else:
+            text = _LRC_TIME_RE.sub("", line).strip()
         text = jp_clean(text)
         if not text:
             continue
@@ -82,61 +173,69 @@ def parse_lrc(path: Path) -> List[Dict]:
             else:
                 ms = int((frac + "00")[:3])
             start_ms = (mm * 60 + ss) * 1000 + ms
+            if start_ms < last_start:
+                in_order = False
+            last_start = start_ms
             entries.append(dict(
-                id=f"{path}|{start_ms}",
+                id=f"{path_str}|{start_ms}",
                 media_type="song",
-                title=path.stem,
+                title=stem_str,
                 episode_or_track="",
                 media_path="",
                 text=text,
                 start_ms=start_ms,
                 end_ms=start_ms + 3000,
-                source_path=str(path),
+                source_path=path_str,
                 context_prev="",
                 context_next=""
             ))
-    entries.sort(key=lambda x: x["start_ms"])
-    for i, e in enumerate(entries):
-        e["context_prev"] = entries[i-1]["text"] if i > 0 else ""
-        e["context_next"] = entries[i+1]["text"] if i < len(entries)-1 else ""
+    if not in_order:
+        entries.sort(key=_BY_START)
+    link_context(entries)
     return entries
 
 def parse_subtitle(path: Path) -> List[Dict]:
-    subs = pysubs2.load(str(path))
+    # 同一文件的所有条目共用，避免逐行重新解析路径
+    path_str = str(path); stem_str = path.stem
+    subs = pysubs2.load(path_str)
     entries = []
     for ev in subs.events:
         text = getattr(ev, "plaintext", None)
         if text is None:
             raw = ev.text or ""
-            text = re.sub(r"\{[^}]*\}", "", raw)
+            text = _ASS_TAG_RE.sub("", raw)
         text = jp_clean(text)
         if not text:
             continue
         start_ms = int(ev.start); end_ms = int(ev.end)
         entries.append(dict(
-            id=f"{path}|{start_ms}",
+            id=f"{path_str}|{start_ms}",
             media_type="anime",
-            title=path.stem,
+            title=stem_str,
             episode_or_track="",
             media_path="",
             text=text,
             start_ms=start_ms,
             end_ms=end_ms,
-            source_path=str(path),
+            source_path=path_str,
             context_prev="",
             context_next=""
         ))
-    for i, e in enumerate(entries):
-        e["context_prev"] = entries[i-1]["text"] if i > 0 else ""
-        e["context_next"] = entries[i+1]["text"] if i < len(entries)-1 else ""
+    link_context(entries)
     return entries
 
 # ------------------ SQLite 索引 ------------------
 def ensure_schema(conn: sqlite3.Connection):
     cur = conn.cursor()
+    # page_size 只对新库生效，且必须在建表（及切换 WAL）之前设置
+    if cur.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone() is None:
+        cur.execute("PRAGMA page_size=8192")
     cur.executescript("""
     PRAGMA journal_mode=WAL;
-    PRAGMA synchronous=OFF;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA cache_size=-262144;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA mmap_size=268435456;
 
     CREATE TABLE IF NOT EXISTS entries(
         id TEXT UNIQUE,
@@ -149,7 +248,9 @@ def ensure_schema(conn: sqlite3.Connection):
         end_ms INTEGER,
         text TEXT,
         context_prev TEXT,
-        context_next TEXT
+        context_next TEXT,
+        text_tok TEXT,
+        reading_tok TEXT
     );
 
     CREATE VIRTUAL TABLE IF NOT EXISTS fts
@@ -160,32 +261,42 @@ def ensure_schema(conn: sqlite3.Connection):
         content_rowid='rowid'
     );
     """)
+    # 旧库没有分词列时补上（FTS 的外部内容表需要从这两列 rebuild）
+    cols = {r[1] for r in cur.execute("PRAGMA table_info(entries)")}
+    for col in ("text_tok", "reading_tok"):
+        if col not in cols:
+            cur.execute(f"ALTER TABLE entries ADD COLUMN {col} TEXT")
     conn.commit()
 
-def insert_batch(conn: sqlite3.Connection, batch: List[Dict]):
+def insert_batch(conn: sqlite3.Connection, batch: List[Dict], tokens: List[Tuple[str, str]],
+                 index_fts: bool = True):
+    """分词结果同时存入 entries；index_fts=False 时不逐行写 FTS，留待最后整体 rebuild。
+    tokens 为在进程池中算好的 (text_tok, reading_tok)，与 batch 一一对应；batch 中的文本须已由 parse_* 清洗。"""
     cur = conn.cursor()
-    # 插入主表
-    cur.executemany("""
-        INSERT OR IGNORE INTO entries
-        (id, media_type, title, episode_or_track, media_path, source_path, start_ms, end_ms, text, context_prev, context_next)
-        VALUES (?,?,?,?,?,?,?,?,?,?,?)
-    """, [(
-        e["id"], e["media_type"], e.get("title",""), e.get("episode_or_track",""),
-        e.get("media_path",""), e.get("source_path",""),
-        int(e["start_ms"]), int(e["end_ms"]),
-        e["text"], e.get("context_prev",""), e.get("context_next","")
-    ) for e in batch])
-    # 获取 rowid 并写 FTS
-    for e in batch:
-        rid = cur.execute("SELECT rowid FROM entries WHERE id=?", (e["id"],)).fetchone()
-        if not rid:
-            continue
-        rid = rid[0]
-        text = jp_clean(e["text"])
-        text_tok = " ".join(tokenize_surface(text))
-        reading_tok = " ".join(tokenize_reading_kana(text))
-        cur.execute("INSERT INTO fts(rowid, text_tok, reading_tok) VALUES (?,?,?)",
-                    (rid, text_tok, reading_tok))
+    fts_rows: List[Tuple[int, str, str]] = []
+    for e, (text_tok, reading_tok) in zip(batch, tokens):
+        # 插入主表；直接用 lastrowid 取 rowid，不再按 id 回查
+        cur.execute("""
+            INSERT OR IGNORE INTO entries
+            (id, media_type, title, episode_or_track, media_path, source_path, start_ms, end_ms, text, context_prev, context_next, text_tok, reading_tok)
+            VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?)
+        """, (
+            e["id"], e["media_type"], e.get("title",""), e.get("episode_or_track",""),
+            e.get("media_path",""), e.get("source_path",""),
+            int(e["start_ms"]), int(e["end_ms"]),
+            e["text"], e.get("context_prev",""), e.get("context_next",""),
+            text_tok, reading_tok
+        ))
+        if cur.rowcount == 0 or not index_fts:
+            continue  # id 已存在（被 IGNORE），其 FTS 行早已写入
+        fts_rows.append((cur.lastrowid, text_tok, reading_tok))
+    # FTS 行攒齐后一次 executemany 写入
+    if fts_rows:
+        cur.executemany("INSERT INTO fts(rowid, text_tok, reading_tok) VALUES (?,?,?)", fts_rows)
+
+def rebuild_fts(conn: sqlite3.Connection):
+    # 从 entries 的分词列一次性重建倒排索引，比逐行增量维护快得多
+    conn.execute("INSERT INTO fts(fts) VALUES('rebuild')")
 
 # ------------------ 扁平风样式（简版） ------------------
 def apply_flat_style(app: QtWidgets.QApplication, theme: str = "dark"):
@@ -211,6 +322,22 @@ def apply_flat_style(app: QtWidgets.QApplication, theme: str = "dark"):
     app.setStyleSheet(qss)
 
 # ------------------ 后台工作线程 ------------------
+COMMIT_FILES = 200                                    # 攒够这么多文件也提交一批分词（小文件多时不致久等）
+COMMIT_ENTRIES = 5000
+TOKENIZE_CHUNK = 256                                  # 每个进程池任务的行数
+TOKENIZE_GROUP = 4096                                 # 攒够这么多行再并行分词
+TOKENIZE_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+LOG_FLUSH_LINES = 64                                  # 日志攒够这么多行或超过 LOG_FLUSH_SEC 才发给界面
+LOG_FLUSH_SEC = 0.25
+PROGRESS_EVERY_SEC = 0.05                             # 进度信号最小间隔
+PARSE_QUEUE_SIZE = 8                                  # 解析线程最多领先写库线程的文件数
+TOKENIZE_INFLIGHT = 2                                 # 最多同时在进程池中分词的批次数
+
+def parse_file(path: Path) -> List[Dict]:
+    if path.suffix.lower() == ".lrc":
+        return parse_lrc(path)
+    return parse_subtitle(path)
+
 class IndexerWorker(QtCore.QObject):
     sig_log = QtCore.Signal(str)
     sig_stage = QtCore.Signal(str)                 # e.g. "扫描文件", "解析/索引"
@@ -221,75 +348,220 @@ class IndexerWorker(QtCore.QObject):
     def __init__(self, roots: List[Path], exts: List[str], db_path: Path, rebuild: bool):
         super().__init__()
         self.roots = roots
-        self.exts = {e.lower() for e in exts}
+        self.exts = tuple({e.lower() for e in exts})
         self.db_path = db_path
         self.rebuild = rebuild
         self._cancel = False
+        self._pending_logs: List[str] = []
+        self._last_log_flush = 0.0
 
     @QtCore.Slot()
     def cancel(self):
         self._cancel = True
 
+    def _log(self, line: str):
+        # 跨线程信号走排队连接，逐行 emit 会压垮界面线程；攒批后一次发出
+        self._pending_logs.append(line)
+        now = time.monotonic()
+        if len(self._pending_logs) >= LOG_FLUSH_LINES or now - self._last_log_flush >= LOG_FLUSH_SEC:
+            self._flush_logs(now)
+
+    def _flush_logs(self, now: Optional[float] = None):
+        if self._pending_logs:
+            self.sig_log.emit("\n".join(self._pending_logs))
+            self._pending_logs.clear()
+        self._last_log_flush = time.monotonic() if now is None else now
+
+    def _done(self, ok: bool, msg: str):
+        self._flush_logs()
+        self.sig_done.emit(ok, msg)
+
     @QtCore.Slot()
     def run(self):
+        self._conn: Optional[sqlite3.Connection] = None
+        self._bulk_fts = False
+        failed = False
+        try:
+            ok, msg = self._build()
+        except Exception as ex:
+            ok, msg, failed = False, f"异常: {ex}", True
+        try:
+            self._close_db(keep=not failed)
+        except Exception as ex:
+            ok, msg = False, f"异常: {ex}"
+        self._done(ok, msg)
+
+    def _close_db(self, keep: bool):
+        # 无论成功、取消还是出错都要走到这里并关闭连接，释放 EXCLUSIVE 锁。
+        # 批量模式下 entries 已按 COMMIT_ENTRIES 分批提交而 FTS 仍为空：必须补建，
+        # 否则这些行永远搜不到（之后的增量构建也会因 INSERT OR IGNORE 跳过它们）
+        conn = self._conn
+        if conn is None:
+            return
+        self._conn = None
         try:
-            if self.rebuild and self.db_path.exists():
+            if self._bulk_fts:
+                self.sig_stage.emit("构建全文索引")
+                rebuild_fts(conn)
+                conn.commit()
+            elif keep:
+                conn.commit()
+            else:
+                conn.rollback()  # 出错时当前批可能只写了 entries 没写 FTS，整批丢弃
+        finally:
+            conn.close()
+
+    def _build(self) -> Tuple[bool, str]:
+        if self.rebuild and self.db_path.exists():
+            try:
+                self.db_path.unlink()
+            except Exception:
+                pass
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # isolation_level=None：模块不再隐式 BEGIN，事务完全由下面显式的 BEGIN/commit 控制；
+        # 热点 INSERT 的 SQL 文本保持不变，可命中语句缓存
+        conn = self._conn = sqlite3.connect(str(self.db_path), isolation_level=None, cached_statements=256)
+        ensure_schema(conn)
+        # 构建期间独占数据库，省去每个事务的加解锁
+        conn.execute("PRAGMA locking_mode=EXCLUSIVE")
+        # 重建且库为空时走批量模式：入库阶段不写 FTS，最后整体 rebuild
+        bulk_fts = self._bulk_fts = self.rebuild and conn.execute("SELECT 1 FROM entries LIMIT 1").fetchone() is None
+
+        # 扫描文件
+        self.sig_stage.emit("扫描文件")
+        files: List[Path] = []
+        for root in self.roots:
+            for p in iter_files(root, self.exts):
+                if self._cancel:
+                    return False, "已取消"
+                files.append(p)
+        total_files = len(files)
+        self._log(f"找到 {total_files} 个文件。")
+
+        # 解析与索引：三段流水线，各段重叠执行
+        #   解析线程：读文件 + 解析字幕，经有界队列交给本线程
+        #   进程池：分词，同时最多 TOKENIZE_INFLIGHT 批在途
+        #   本线程：攒批提交分词、按顺序写入 SQLite（连接只在本线程使用），每 COMMIT_ENTRIES 行提交一次
+        self.sig_stage.emit("解析与索引")
+        self._log(f"分词后端：{TOKENIZER_BACKEND if TOKENIZER_BACKEND in _TOKEN_BACKENDS else 'sudachi'}")
+        total_entries = 0
+        files_in_batch, entries_in_tx = 0, 0
+        pending: List[Dict] = []
+        inflight = deque()  # (batch, [future, ...])，按提交顺序写库
+        last_progress = 0.0
+        parsed_q: queue.Queue = queue.Queue(maxsize=PARSE_QUEUE_SIZE)
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            # 队列满时定期检查 stop，避免写库线程异常退出后解析线程永远阻塞
+            while not stop.is_set():
                 try:
-                    self.db_path.unlink()
-                except Exception:
-                    pass
-            self.db_path.parent.mkdir(parents=True, exist_ok=True)
-            conn = sqlite3.connect(str(self.db_path))
-            ensure_schema(conn)
-
-            # 扫描文件
-            self.sig_stage.emit("扫描文件")
-            files: List[Path] = []
-            for root in self.roots:
-                for p in root.rglob("*"):
-                    if self._cancel: 
-                        conn.close(); self.sig_done.emit(False, "已取消"); return
-                    if p.suffix.lower() in self.exts and p.is_file():
-                        files.append(p)
-            total_files = len(files)
-            self.sig_log.emit(f"找到 {total_files} 个文件。")
-
-            # 解析与索引
-            self.sig_stage.emit("解析与索引")
-            total_entries = 0
+                    parsed_q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def reader():
             for i, f in enumerate(files, 1):
-                if self._cancel:
-                    conn.close(); self.sig_done.emit(False, "已取消"); return
+                if self._cancel or stop.is_set():
+                    break
                 try:
-                    if f.suffix.lower() == ".lrc":
-                        items = parse_lrc(f)
-                    else:
-                        items = parse_subtitle(f)
-                    if items:
-                        # 清理文本并批量入库（每文件一批）
-                        for e in items:
-                            e["text"] = jp_clean(e["text"])
-                            e["context_prev"] = jp_clean(e.get("context_prev",""))
-                            e["context_next"] = jp_clean(e.get("context_next",""))
-                        insert_batch(conn, items)
-                        total_entries += len(items)
-                        if total_entries % 1000 == 0:
-                            conn.commit()
-                    self.sig_log.emit(f"[{i}/{total_files}] {f.name} -> {len(items)} 行")
+                    item = (i, f, parse_file(f), None)
                 except Exception as ex:
-                    self.sig_log.emit(f"[WARN] 解析失败: {f} | {ex}")
-                self.sig_progress_files.emit(i, total_files)
-                self.sig_progress_entries.emit(total_entries)
-
-            conn.commit()
-            # 辅助索引
-            cur = conn.cursor()
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_entries_title ON entries(title)")
-            cur.execute("CREATE INDEX IF NOT EXISTS idx_entries_media_type ON entries(media_type)")
-            conn.commit(); conn.close()
-            self.sig_done.emit(True, f"完成！共索引 {total_entries} 行。")
-        except Exception as ex:
-            self.sig_done.emit(False, f"异常: {ex}")
+                    item = (i, f, [], ex)
+                if not put(item):
+                    return
+            put(None)
+
+        def submit(pool: ProcessPoolExecutor):
+            if not pending:
+                return
+            batch = pending[:]
+            pending.clear()
+            texts = [e["text"] for e in batch]
+            futures = [pool.submit(tokenize_chunk, texts[k:k + TOKENIZE_CHUNK])
+                       for k in range(0, len(texts), TOKENIZE_CHUNK)]
+            inflight.append((batch, futures))
+
+        def write_ready(max_inflight: int):
+            # 写入已分词完的批次；在途批次超过 max_inflight 时等待最早的一批
+            nonlocal total_entries, entries_in_tx
+            while inflight and (len(inflight) > max_inflight or all(fu.done() for fu in inflight[0][1])):
+                batch, futures = inflight.popleft()
+                rows: List[Dict] = []
+                tokens: List[Tuple[str, str]] = []
+                for k, fu in enumerate(futures):
+                    chunk = batch[k * TOKENIZE_CHUNK:(k + 1) * TOKENIZE_CHUNK]
+                    try:
+                        tokens.extend(fu.result())
+                    except Exception as ex:
+                        # 分词失败只跳过这一小批涉及的文件，与解析失败一样记 WARN 后继续
+                        for src in dict.fromkeys(e["source_path"] for e in chunk):
+                            self._log(f"[WARN] 分词失败: {src} | {ex}")
+                        continue
+                    rows.extend(chunk)
+                insert_batch(conn, rows, tokens, index_fts=not bulk_fts)
+                total_entries += len(rows)
+                entries_in_tx += len(rows)
+                if entries_in_tx >= COMMIT_ENTRIES:
+                    conn.commit(); conn.execute("BEGIN")
+                    entries_in_tx = 0
+
+        conn.execute("BEGIN")
+        reader_thread = threading.Thread(target=reader, daemon=True)
+        reader_thread.start()
+        try:
+            # spawn：解析线程已在运行，fork 带线程的进程可能死锁
+            with ProcessPoolExecutor(max_workers=TOKENIZE_WORKERS,
+                                     mp_context=multiprocessing.get_context("spawn")) as pool:
+                while True:
+                    item = parsed_q.get()
+                    if item is None or self._cancel:
+                        break
+                    i, f, items, err = item
+                    if err is None:
+                        # parse_* 已清洗文本（上下文取自已清洗的相邻行），攒批后统一分词入库
+                        pending.extend(items)
+                        self._log(f"[{i}/{total_files}] {f.name} -> {len(items)} 行")
+                    else:
+                        self._log(f"[WARN] 解析失败: {f} | {err}")
+                    files_in_batch += 1
+                    if len(pending) >= TOKENIZE_GROUP or files_in_batch >= COMMIT_FILES:
+                        submit(pool)
+                        files_in_batch = 0
+                    write_ready(TOKENIZE_INFLIGHT)
+                    now = time.monotonic()
+                    if now - last_progress >= PROGRESS_EVERY_SEC or i == total_files:
+                        self.sig_progress_files.emit(i, total_files)
+                        self.sig_progress_entries.emit(total_entries)
+                        last_progress = now
+                if self._cancel:
+                    # 取消：丢弃尚未写库的批次，已写入的部分照常提交
+                    for _, futures in inflight:
+                        for fu in futures:
+                            fu.cancel()
+                    inflight.clear()
+                else:
+                    submit(pool)
+                    write_ready(0)
+        finally:
+            stop.set()
+        if self._cancel:
+            return False, "已取消"
+        self.sig_progress_entries.emit(total_entries)
+
+        if bulk_fts:
+            self.sig_stage.emit("构建全文索引")
+            rebuild_fts(conn)
+            self._bulk_fts = False
+        conn.commit()
+        # 辅助索引
+        cur = conn.cursor()
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_entries_title ON entries(title)")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_entries_media_type ON entries(media_type)")
+        conn.commit()
+        return True, f"完成！共索引 {total_entries} 行。"
 
 # ------------------ 主窗口 ------------------
 class IndexerWindow(QtWidgets.QMainWindow):
@@ -406,12 +678,11 @@ class IndexerWindow(QtWidgets.QMainWindow):
         roots = [Path(self.list_dirs.item(i).text()) for i in range(self.list_dirs.count())]
         if not roots:
             QtWidgets.QMessageBox.information(self, "提示", "请先添加至少一个目录"); return
-        exts = set(self.get_exts())
+        exts = tuple(self.get_exts())
         count = 0
         for r in roots:
-            for p in r.rglob("*"):
-                if p.suffix.lower() in exts and p.is_file():
-                    count += 1
+            for _ in iter_files(r, exts):
+                count += 1
         QtWidgets.QMessageBox.information(self, "扫描结果", f"共找到 {count} 个待解析文件。")
 
     def start_build(self):
@@ -465,6 +736,7 @@ class IndexerWindow(QtWidgets.QMainWindow):
         QtWidgets.QMessageBox.information(self, "完成" if ok else "中止/失败", msg)
 
 def main():
+    multiprocessing.freeze_support()  # 打包成 exe 后，分词子进程需要
     app = QtWidgets.QApplication(sys.argv)
     win = IndexerWindow()
     win.show()
@@ -0,0 +1,58 @@
+# jp_tokenize.py
+# search.py / play_snippet.py 共用的查询分词：同一进程只加载一份 Sudachi 词典，重复查询直接命中缓存
+from functools import lru_cache
+from typing import List, Optional, Tuple
+from sudachipy import dictionary, tokenizer as sudachi_tokenizer
+
+_mode = sudachi_tokenizer.Tokenizer.SplitMode.C
+
+@lru_cache(maxsize=1)
+def _get_sudachi():
+    # 首次分词时才加载词典，--help 等不搜索的调用不付加载代价
+    return dictionary.Dictionary().create()
+
+def tokenize_both(q: str):
+    """一次 Sudachi 分析逐词给出 (表层形, 读音)；空串表示该词在对应一侧没有内容"""
+    for m in _get_sudachi().tokenize(q, _mode):
+        s = m.surface().strip()
+        r = (m.reading_form() or m.surface()).strip()
+        if s or r:
+            yield s, r
+
+@lru_cache(maxsize=512)
+def query_tokens(q: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """(表层词, 读音词)；同一查询只分析一次。
+    表层形不含任何字母数字的词（标点、〜、♪ 等）在索引里本就不存在，AND 上它只会让整条查询落空，
+    因此按表层形决定跳过，并且表层与读音两侧一起跳过（否则 〜 的读音“キゴウ”会单独留在读音组里）"""
+    surfs, reads = [], []
+    for s, r in tokenize_both(q):
+        if not is_fts_term(s):
+            continue
+        surfs.append(s)
+        if r:
+            reads.append(r)
+    return tuple(surfs), tuple(reads)
+
+def is_fts_term(surface: str) -> bool:
+    return any(ch.isalnum() for ch in surface)
+
+def fts_terms(tokens) -> List[str]:
+    """把词转成 FTS5 字面量 "..."（内部引号加倍），不必再删引号，也不会被当成 NEAR/*/- 等运算符"""
+    return ['"' + t.replace('"', '""') + '"' for t in tokens]
+
+@lru_cache(maxsize=512)
+def build_group_queries(query: str) -> Tuple[Optional[str], Optional[str]]:
+    """分别返回 表层词组 与 读音词组 的 MATCH 字符串（无词时为 None），供分路检索后融合排序"""
+    surfs, reads = query_tokens(query)
+    # 每个词都限定到对应列，并用 AND 连接
+    s_expr = " AND ".join(f'text_tok:{t}' for t in fts_terms(surfs)) or None
+    r_expr = " AND ".join(f'reading_tok:{t}' for t in fts_terms(reads)) or None
+    return s_expr, r_expr
+
+@lru_cache(maxsize=512)
+def build_match_query(query: str) -> Optional[str]:
+    parts = [p for p in build_group_queries(query) if p]
+    if not parts:
+        return None
+    # 两组之间用 OR 连接，形成一个统一的 MATCH 字符串
+    return " OR ".join(f'({p})' for p in parts)
@@ -1,41 +1,123 @@
 # parse_media.py
 import argparse
 import json
+import operator
+import os
 import re
 import unicodedata
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 import pysubs2
 from tqdm import tqdm
 
+try:
+    import orjson  # 可选：C 实现，直接输出 bytes，比 json.dumps 快得多
+except ImportError:
+    orjson = None
+
 def nfkc(text: str) -> str:
-    return unicodedata.normalize("NFKC", text or "").strip()
+    text = text or ""
+    # 纯 ASCII 在 NFKC 下不变，isascii 只查一个标志位，跳过 normalize
+    if text.isascii():
+        return text.strip()
+    return unicodedata.normalize("NFKC", text).strip()
 
+@lru_cache(maxsize=8192)  # 相同的时间戳（如 LRC 的同一时刻、重复预览）只格式化一次
 def ms_to_timestr(ms: int) -> str:
     s, ms = divmod(ms, 1000)
     m, s = divmod(s, 60)
     h, m = divmod(m, 60)
     return f"{h:02d}:{m:02d}:{s:02d}.{ms:03d}"
 
+_LRC_TIME_RE = re.compile(r"\[(\d{1,2}):(\d{2})(?:[.:](\d{1,3}))?\]")
+_ASS_TAG_RE = re.compile(r"\{[^}]*\}")
+
 def read_text_guess(path: Path) -> str:
-    # 简单编码猜测（LRC 常见）
+    # 简单编码猜测（LRC 常见）：只读一次字节，在内存里依次尝试解码
+    data = path.read_bytes()
+    if data[:3] == b"\xef\xbb\xbf":
+        # 带 BOM 也严格解码：有坏字节时不悄悄丢弃，去掉 BOM 后交给下面的编码猜测
+        data = data[3:]
+        try:
+            return data.decode("utf-8")
+        except UnicodeDecodeError:
+            pass
     for enc in ("utf-8", "cp932", "cp936"):
         try:
-            return path.read_text(encoding=enc)
+            return data.decode(enc)
         except UnicodeDecodeError:
             continue
-    return path.read_text(encoding="utf-8", errors="ignore")
+    # 都失败时才用 charset_normalizer 探测（可选依赖，按需导入）
+    try:
+        from charset_normalizer import from_bytes
+    except ImportError:
+        from_bytes = None
+    if from_bytes is not None:
+        best = from_bytes(data).best()
+        if best is not None:
+            return str(best)
+    return data.decode("utf-8", errors="ignore")
+
+class Entry:
+    """一条字幕/歌词行。用 __slots__ 代替 dict，条目多时内存约省一半以上；字段顺序即 JSONL 的键顺序"""
+    __slots__ = ("id", "media_type", "title", "episode_or_track", "media_path", "text",
+                 "start_ms", "end_ms", "source_path", "context_prev", "context_next")
+
+    def __init__(self, id: str, media_type: str, title: str, text: str,
+                 start_ms: int, end_ms: int, source_path: str):
+        self.id = id
+        self.media_type = media_type
+        self.title = title
+        self.episode_or_track = ""
+        self.media_path = ""
+        self.text = text
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.source_path = source_path
+        self.context_prev = ""
+        self.context_next = ""
+
+    def to_dict(self) -> Dict:
+        return dict(zip(self.__slots__, _entry_fields(self)))
+
+_entry_fields = operator.attrgetter(*Entry.__slots__)
+_by_start = operator.attrgetter("start_ms")
+
+def link_context(entries: List[Entry]):
+    # 相邻行互为上下文：错位 zip，省去逐行下标与边界判断
+    texts = [e.text for e in entries]
+    for e, prev, nxt in zip(entries, [""] + texts[:-1], texts[1:] + [""]):
+        e.context_prev = prev
+        e.context_next = nxt
 
-def parse_lrc(path: Path) -> List[Dict]:
+def _tags_leading(tags) -> bool:
+    # 标签是否从行首开始且首尾相接，如 [00:01.00][00:30.00]歌词
+    pos = 0
+    for m in tags:
+        if m.start() != pos:
+            return False
+        pos = m.end()
+    return True
+
+def parse_lrc(path: Path) -> List[Entry]:
+    # 同一文件的所有条目共用，避免逐行重新解析路径
+    path_str = str(path); stem_str = path.stem
     txt = read_text_guess(path)
     lines = txt.splitlines()
-    entries: List[Dict] = []
-    time_tag = re.compile(r"\[(\d{1,2}):(\d{2})(?:[.:](\d{1,3}))?\]")
+    entries: List[Entry] = []
+    # LRC 基本按时间顺序书写：记录是否出现倒序，只有倒序时才排序
+    in_order, last_start = True, -1
     for line in lines:
-        tags = list(time_tag.finditer(line))
+        tags = list(_LRC_TIME_RE.finditer(line))
         if not tags:
             continue
-        text = time_tag.sub("", line).strip()
+        # 时间标签通常全部在行首：直接切掉最后一个标签之前的部分，省去 sub 的第二遍扫描
+        if _tags_leading(tags):
+            text = line[tags[-1].end():].strip()
+        else:
+            text = _LRC_TIME_RE.sub("", line).strip()
         text = nfkc(text)
         if not text:
             continue
@@ -48,69 +130,79 @@ def parse_lrc(path: Path) -> List[Dict]:
                 frac = (frac + "00")[:3]  # 归一为毫秒
                 ms = int(frac)
             start_ms = (mm * 60 + ss) * 1000 + ms
-            entries.append({
-                "id": f"{path}|{start_ms}",
-                "media_type": "song",
-                "title": path.stem,
-                "episode_or_track": "",
-                "media_path": "",
-                "text": text,
-                "start_ms": start_ms,
-                "end_ms": start_ms + 3000,  # 没有结束时间就默认 3 秒
-                "source_path": str(path),
-                "context_prev": "",
-                "context_next": "",
-            })
-    entries.sort(key=lambda x: x["start_ms"])
-    for i, e in enumerate(entries):
-        e["context_prev"] = entries[i-1]["text"] if i > 0 else ""
-        e["context_next"] = entries[i+1]["text"] if i < len(entries)-1 else ""
+            if start_ms < last_start:
+                in_order = False
+            last_start = start_ms
+            # 没有结束时间就默认 3 秒
+            entries.append(Entry(f"{path_str}|{start_ms}", "song", stem_str, text,
+                                 start_ms, start_ms + 3000, path_str))
+    if not in_order:
+        entries.sort(key=_by_start)
+    link_context(entries)
     return entries
 
-def parse_subtitle(path: Path) -> List[Dict]:
-    subs = pysubs2.load(str(path))  # 自动处理编码/格式（SRT/ASS）
-    entries: List[Dict] = []
+def parse_subtitle(path: Path) -> List[Entry]:
+    # 同一文件的所有条目共用，避免逐行重新解析路径
+    path_str = str(path); stem_str = path.stem
+    subs = pysubs2.load(path_str)  # 自动处理编码/格式（SRT/ASS）
+    entries: List[Entry] = []
     for ev in subs.events:
         text = getattr(ev, "plaintext", None)
         if text is None:
             raw = ev.text or ""
-            text = re.sub(r"\{[^}]*\}", "", raw)
+            text = _ASS_TAG_RE.sub("", raw)
         text = nfkc(text)
         if not text:
             continue
         start_ms = int(ev.start)
         end_ms = int(ev.end)
-        entries.append({
-            "id": f"{path}|{start_ms}",
-            "media_type": "anime",
-            "title": path.stem,
-            "episode_or_track": "",
-            "media_path": "",
-            "text": text,
-            "start_ms": start_ms,
-            "end_ms": end_ms,
-            "source_path": str(path),
-            "context_prev": "",
-            "context_next": "",
-        })
-    for i, e in enumerate(entries):
-        e["context_prev"] = entries[i-1]["text"] if i > 0 else ""
-        e["context_next"] = entries[i+1]["text"] if i < len(entries)-1 else ""
+        entries.append(Entry(f"{path_str}|{start_ms}", "anime", stem_str, text,
+                             start_ms, end_ms, path_str))
+    link_context(entries)
     return entries
 
-def scan_folder(root: Path) -> List[Dict]:
-    exts = {".srt", ".ass", ".lrc"}
-    all_entries: List[Dict] = []
-    files = [p for p in root.rglob("*") if p.suffix.lower() in exts]
-    print(f"Found {len(files)} subtitle/lyric files.")
-    for f in tqdm(files, desc="Parsing"):
+def _parse_one(f: Path) -> Tuple[List[Entry], Optional[str]]:
+    # 进程池任务：单个文件解析失败只返回错误信息，不影响其他文件
+    try:
+        if f.suffix.lower() == ".lrc":
+            return parse_lrc(f), None
+        return parse_subtitle(f), None
+    except Exception as e:
+        return [], str(e)
+
+SUB_EXTS = (".srt", ".ass", ".lrc")
+
+def iter_files(root: Path, exts: Tuple[str, ...]):
+    # os.scandir 递归：只按 DirEntry.name 过滤后缀，不为无关文件构造 Path，命中才 stat
+    stack = [str(root)]
+    while stack:
         try:
-            if f.suffix.lower() == ".lrc":
-                all_entries.extend(parse_lrc(f))
-            else:
-                all_entries.extend(parse_subtitle(f))
-        except Exception as e:
-            print(f"[WARN] Failed to parse {f}: {e}")
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for e in it:
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        stack.append(e.path)
+                    elif e.name.lower().endswith(exts) and e.is_file():
+                        yield Path(e.path)
+                except OSError:
+                    continue
+
+def scan_folder(root: Path) -> List[Entry]:
+    all_entries: List[Entry] = []
+    files = list(iter_files(root, SUB_EXTS))
+    print(f"Found {len(files)} subtitle/lyric files.")
+    # 各文件互不相关，多进程并行解析；map 保持文件顺序，输出与串行时一致
+    workers = os.cpu_count() or 1
+    chunksize = max(1, len(files) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(_parse_one, files, chunksize=chunksize)
+        for f, (entries, err) in tqdm(zip(files, results), total=len(files), desc="Parsing"):
+            if err is not None:
+                print(f"[WARN] Failed to parse {f}: {err}")
+            all_entries.extend(entries)
     return all_entries
 
 def main():
@@ -130,14 +222,20 @@ def main():
 
     # 预览前N条
     for e in entries[:args.preview]:
-        print(f"[{e['media_type']}] {e['title']} {ms_to_timestr(e['start_ms'])}-{ms_to_timestr(e['end_ms'])} | {e['text']}")
+        print(f"[{e.media_type}] {e.title} {ms_to_timestr(e.start_ms)}-{ms_to_timestr(e.end_ms)} | {e.text}")
 
     if args.out:
         out_path = Path(args.out)
         out_path.parent.mkdir(parents=True, exist_ok=True)
-        with out_path.open("w", encoding="utf-8") as w:
-            for e in entries:
-                w.write(json.dumps(e, ensure_ascii=False) + "\n")
+        with out_path.open("wb", buffering=8 << 20) as w:
+            if orjson is not None:
+                opt = orjson.OPT_APPEND_NEWLINE
+                for e in entries:
+                    w.write(orjson.dumps(e.to_dict(), option=opt))
+            else:
+                dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+                for e in entries:
+                    w.write(f"{dumps(e.to_dict())}\n".encode("utf-8"))
         print(f"JSONL written: {out_path}")
 
 if __name__ == "__main__":
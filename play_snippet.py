@@ -1,80 +1,96 @@
 # play_snippet.py
 import argparse
+import os
 import sqlite3
 import subprocess
 import shutil
+import sys
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional
-from sudachipy import dictionary, tokenizer as sudachi_tokenizer
+from typing import Dict, List, Optional
+from jp_tokenize import build_group_queries
 
 VIDEO_EXTS = [".mkv", ".mp4", ".ts", ".m4v", ".avi", ".mov"]
 AUDIO_EXTS = [".mp3", ".flac", ".m4a", ".aac", ".wav", ".ogg"]
-MEDIA_EXTS = VIDEO_EXTS + AUDIO_EXTS
+MEDIA_EXT_ORDER = tuple(VIDEO_EXTS + AUDIO_EXTS)  # 候选排序用的优先级
+MEDIA_EXTS = frozenset(MEDIA_EXT_ORDER)
 
+@lru_cache(maxsize=8192)  # 相同的时间戳（如 LRC 的同一时刻、重复预览）只格式化一次
 def ms_to_timestr(ms: int) -> str:
     s, ms = divmod(int(ms), 1000)
     m, s = divmod(s, 60)
     h, m = divmod(m, 60)
     return f"{h:02d}:{m:02d}:{s:02d}.{ms:03d}"
 
-_sudachi = dictionary.Dictionary().create()
-_mode = sudachi_tokenizer.Tokenizer.SplitMode.C
-
-def tokenize_surface(q: str):
-    for m in _sudachi.tokenize(q, _mode):
-        w = m.surface().strip()
-        if w:
-            yield w
-
-def tokenize_reading(q: str):
-    for m in _sudachi.tokenize(q, _mode):
-        r = (m.reading_form() or m.surface()).strip()
-        if r:
-            yield r
-
-def build_match_query(query: str):
-    s_tokens = [t.replace('"', '').replace("'", "") for t in tokenize_surface(query)]
-    r_tokens = [t.replace('"', '').replace("'", "") for t in tokenize_reading(query)]
-    parts = []
-    if s_tokens:
-        parts.append(" AND ".join(f'text_tok:{t}' for t in s_tokens))
-    if r_tokens:
-        parts.append(" AND ".join(f'reading_tok:{t}' for t in r_tokens))
-    if not parts:
-        return None
-    return " OR ".join(f'({p})' for p in parts if p)
-
-def query_db(db_path: Path, query: str, topn: int):
-    conn = sqlite3.connect(str(db_path))
-    cur = conn.cursor()
-    match_expr = build_match_query(query)
-    if not match_expr:
-        print("Empty query after tokenization."); return []
-    sql = """
-    SELECT e.title, e.media_type, e.start_ms, e.end_ms, e.text, e.source_path
-    FROM fts
-    JOIN entries e ON e.rowid = fts.rowid
-    WHERE fts MATCH ?
-    ORDER BY bm25(fts)
-    LIMIT ?
-    """
-    params = [match_expr, topn]
+def ms_to_ffsec(ms: int) -> str:
+    # 毫秒 -> ffplay 的秒数参数（如 12.345），纯整数运算
+    ms = int(ms)
+    return f"{ms // 1000}.{ms % 1000:03d}"
+
+RRF_K = 10  # 倒数排名融合的平滑常数：score = Σ 1/(RRF_K + rank)
+
+_SQL_RANK_BM25 = "SELECT rowid FROM fts WHERE fts MATCH ? ORDER BY bm25(fts) LIMIT ?"
+_SQL_RANK_PLAIN = "SELECT rowid FROM fts WHERE fts MATCH ? LIMIT ?"
+
+def open_db(db_path: Path) -> sqlite3.Connection:
+    # 整个会话只连一次；排名 SQL 也只在这里选定一次，之后的查询文本固定，可命中语句缓存
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA cache_size=-65536")
+    return conn
+
+def rank_sql(conn: sqlite3.Connection) -> str:
+    # 兼容没有 bm25 函数的环境（此时各路内部按 FTS 默认顺序）
     try:
-        rows = cur.execute(sql, params).fetchall()
+        conn.execute("SELECT bm25(fts) FROM fts LIMIT 0").fetchall()
     except sqlite3.OperationalError as e:
         if "no such function: bm25" in str(e).lower():
-            sql = """
-            SELECT e.title, e.media_type, e.start_ms, e.end_ms, e.text, e.source_path
-            FROM fts
-            JOIN entries e ON e.rowid = fts.rowid
-            WHERE fts MATCH ?
-            LIMIT ?
-            """
-            rows = cur.execute(sql, params).fetchall()
-        else:
-            raise
-    conn.close()
-    return rows
+            return _SQL_RANK_PLAIN
+        raise
+    return _SQL_RANK_BM25
+
+def query_db(conn: sqlite3.Connection, query: str, topn: int, sql_rank: str = _SQL_RANK_BM25):
+    """表层词组、读音词组分两路各取 topn*3 条，按 RRF 融合排名后取前 topn 条。
+    两组合在一起做单次 bm25 时，区分度低的假名读音词容易压过表层词。"""
+    groups = [g for g in build_group_queries(query) if g]
+    if not groups:
+        print("Empty query after tokenization."); return []
+    cur = conn.cursor()
+    scores: Dict[int, float] = {}
+    for expr in groups:
+        for rank, (rid,) in enumerate(cur.execute(sql_rank, (expr, topn * 3)), 1):
+            scores[rid] = scores.get(rid, 0.0) + 1.0 / (RRF_K + rank)
+    top = sorted(scores, key=scores.__getitem__, reverse=True)[:topn]
+    if not top:
+        return []
+    sql = f"""
+    SELECT rowid, title, media_type, start_ms, end_ms, text, source_path
+    FROM entries
+    WHERE rowid IN ({",".join("?" * len(top))})
+    """
+    by_id = {r[0]: r[1:] for r in cur.execute(sql, top)}
+    return [by_id[rid] for rid in top if rid in by_id]
+
+def _ext_rank(p: Path) -> int:
+    return MEDIA_EXT_ORDER.index(p.suffix.lower())
+
+def _walk_named(root: Path, wanted_lower: set):
+    """os.scandir 递归，产出文件名（小写）在 wanted_lower 中的文件"""
+    stack = [str(root)]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except OSError:
+            continue
+        with it:
+            for e in it:
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        stack.append(e.path)
+                    elif e.name.lower() in wanted_lower and e.is_file():
+                        yield Path(e.path)
+                except OSError:
+                    continue
 
 def find_media_candidates(source_path: Optional[Path], media_root: Optional[Path]) -> List[Path]:
     """
@@ -88,23 +104,26 @@ def find_media_candidates(source_path: Optional[Path], media_root: Optional[Path
     if source_path is not None:
         stem = source_path.stem
         folder = source_path.parent
-        # 同目录同stem
-        for ext in MEDIA_EXTS:
-            p = folder / f"{stem}{ext}"
-            if p.exists():
-                candidates.append(p)
-        # 同目录的其他媒体文件
-        if not candidates:
-            for p in folder.iterdir():
-                if p.is_file() and p.suffix.lower() in MEDIA_EXTS:
-                    candidates.append(p)
+        # 只读一次目录，再用集合匹配同stem（两侧都转小写，兼容大小写不敏感的文件系统）
+        media: List[Path] = []
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    if os.path.splitext(entry.name)[1].lower() in MEDIA_EXTS and entry.is_file():
+                        media.append(Path(entry.path))
+        except OSError:
+            pass
+        wanted = {f"{stem}{ext}".lower() for ext in MEDIA_EXTS}
+        same = [p for p in media if p.name.lower() in wanted]
+        same.sort(key=_ext_rank)
+        # 同目录同stem；没有时退回同目录的其他媒体文件
+        candidates.extend(same or media)
 
     # 在 media_root 下查找（优先同stem）
     if media_root:
         if stem:
-            for ext in MEDIA_EXTS:
-                for p in media_root.rglob(f"{stem}{ext}"):
-                    candidates.append(p)
+            # 只遍历一遍目录树，按文件名集合匹配（wanted 同上），不再每个扩展名各 rglob 一次
+            candidates.extend(sorted(_walk_named(media_root, wanted), key=_ext_rank))
         elif not candidates:
             # 没有 stem 信息时，尽量少扫：只列出顶层媒体文件
             for p in media_root.glob("*"):
@@ -112,25 +131,25 @@ def find_media_candidates(source_path: Optional[Path], media_root: Optional[Path
                     candidates.append(p)
 
     # 去重，保持顺序
-    seen = set()
-    uniq = []
-    for p in candidates:
-        if p not in seen:
-            uniq.append(p); seen.add(p)
-    return uniq
+    return list(dict.fromkeys(candidates))
+
+_FFPLAY = shutil.which("ffplay")  # 启动时查一次 PATH
 
 def play_with_ffplay(media: Path, start_ms: int, end_ms: int, audio_only=True, pad_ms=400):
-    if shutil.which("ffplay") is None:
+    if _FFPLAY is None:
         raise RuntimeError("未找到 ffplay，请确保已安装 FFmpeg 并将其 bin 目录添加到 PATH。")
 
     ss = max(0, start_ms - pad_ms)
     dur = max(1, (end_ms - start_ms) + 2 * pad_ms)
 
-    args = ["ffplay", "-ss", f"{ss/1000:.3f}", "-t", f"{dur/1000:.3f}", "-i", str(media), "-autoexit", "-loglevel", "error"]
+    args = [_FFPLAY, "-ss", ms_to_ffsec(ss), "-t", ms_to_ffsec(dur), "-i", str(media), "-autoexit", "-loglevel", "error"]
     if audio_only:
         args += ["-vn", "-nodisp"]
     print(f"播放: {media} @ {ms_to_timestr(ss)} ~ +{dur/1000:.2f}s")
-    subprocess.run(args)
+    # 已用 -loglevel error，输出直接丢弃，不占用父进程的控制台句柄
+    proc = subprocess.Popen(args, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if proc.wait() != 0:
+        print(f"ffplay 异常退出（返回码 {proc.returncode}）")
 
 def main():
     ap = argparse.ArgumentParser()
@@ -138,11 +157,16 @@ def main():
     ap.add_argument("--query", required=True)
     ap.add_argument("--top", type=int, default=10)
     ap.add_argument("--choose", type=int, help="直接选择第N条结果（1-based）")
+    ap.add_argument("--media-choose", type=int, help="有多个候选媒体时直接选择第N个（1-based）；非交互环境下默认第1个")
     ap.add_argument("--media-root", type=str, help="可选：提供一个媒体根目录，找不到同名文件时到这里递归查找")
     ap.add_argument("--show-video", action="store_true", help="显示视频画面（否则仅音频）")
     args = ap.parse_args()
 
-    rows = query_db(Path(args.db), args.query, args.top)
+    conn = open_db(Path(args.db))
+    try:
+        rows = query_db(conn, args.query, args.top, rank_sql(conn))
+    finally:
+        conn.close()
     if not rows:
         print("没有命中结果"); return
 
@@ -168,15 +192,21 @@ def main():
 
     media = cands[0]
     if len(cands) > 1:
-        print("找到多个媒体文件：")
-        for i, p in enumerate(cands, 1):
-            print(f"{i}. {p}")
-        try:
-            pick = int(input("请选择媒体文件序号: ").strip())
-            if 1 <= pick <= len(cands):
-                media = cands[pick-1]
-        except Exception:
-            pass
+        if args.media_choose is not None:
+            if 1 <= args.media_choose <= len(cands):
+                media = cands[args.media_choose-1]
+            else:
+                print(f"媒体序号超出范围，使用第1个：{media}")
+        elif sys.stdin.isatty():
+            print("找到多个媒体文件：")
+            for i, p in enumerate(cands, 1):
+                print(f"{i}. {p}")
+            try:
+                pick = int(input("请选择媒体文件序号: ").strip())
+                if 1 <= pick <= len(cands):
+                    media = cands[pick-1]
+            except Exception:
+                pass
 
     try:
         play_with_ffplay(media, s, e, audio_only=not args.show_video)
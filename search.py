@@ -1,47 +1,17 @@
 # search.py
 import argparse
 import sqlite3
+from functools import lru_cache
 from pathlib import Path
-from sudachipy import dictionary, tokenizer as sudachi_tokenizer
+from jp_tokenize import build_match_query
 
+@lru_cache(maxsize=8192)  # 相同的时间戳（如 LRC 的同一时刻、重复预览）只格式化一次
 def ms_to_timestr(ms: int) -> str:
     s, ms = divmod(int(ms), 1000)
     m, s = divmod(s, 60)
     h, m = divmod(m, 60)
     return f"{h:02d}:{m:02d}:{s:02d}.{ms:03d}"
 
-_sudachi = dictionary.Dictionary().create()
-_mode = sudachi_tokenizer.Tokenizer.SplitMode.C
-
-def tokenize_surface(q: str):
-    for m in _sudachi.tokenize(q, _mode):
-        w = m.surface().strip()
-        if w:
-            yield w
-
-def tokenize_reading(q: str):
-    for m in _sudachi.tokenize(q, _mode):
-        r = (m.reading_form() or m.surface()).strip()
-        if r:
-            yield r
-
-def build_match_query(query: str):
-    s_tokens = [t.replace('"', '').replace("'", "") for t in tokenize_surface(query)]
-    r_tokens = [t.replace('"', '').replace("'", "") for t in tokenize_reading(query)]
-
-    parts = []
-    if s_tokens:
-        # 每个词都限定到 text_tok 列，并用 AND 连接
-        parts.append(" AND ".join(f'text_tok:{t}' for t in s_tokens))
-    if r_tokens:
-        # 每个词都限定到 reading_tok 列，并用 AND 连接
-        parts.append(" AND ".join(f'reading_tok:{t}' for t in r_tokens))
-
-    if not parts:
-        return None
-    # 两组之间用 OR 连接，形成一个统一的 MATCH 字符串
-    return " OR ".join(f'({p})' for p in parts if p)
-
 def search(db_path: Path, query: str, topn: int = 20, debug: bool = False):
     conn = sqlite3.connect(str(db_path))
     cur = conn.cursor()